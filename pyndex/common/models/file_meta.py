@@ -1,10 +1,37 @@
 from datetime import UTC, datetime
+import hashlib
 import json
 import os
 import pathlib
-from typing import Optional
+import shutil
+import tempfile
+import threading
+from typing import Any, ClassVar, Optional
+import zipfile
+import anyio
 from pydantic import BaseModel, Field, computed_field
 from litestar.datastructures import UploadFile
+from packaging.version import InvalidVersion, Version
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an uploaded file exceeds the configured maximum size"""
+
+
+class DigestMismatchError(ValueError):
+    """Raised when an uploaded file doesn't match a digest supplied by the client"""
+
+
+# Fields stored in the sidecar that aren't part of the core metadata
+NON_METADATA_FIELDS = {
+    "index_path",
+    "metadata_path",
+    "index_dir",
+    "size",
+    "core_metadata_sha256",
+}
 
 FIELD_MAP = {
     "project_url": "Project-URL",
@@ -50,6 +77,8 @@ class FileMetadata(BaseModel):
     sha256_digest: Optional[str] = None
     blake2_256_digest: Optional[str] = None
     pyversion: Optional[str] = None
+    size: Optional[int] = None
+    core_metadata_sha256: Optional[str] = None
     content: Optional[UploadFile] = Field(exclude=True, default=None)
     filename: Optional[str] = None
     upload_time: datetime = None
@@ -75,28 +104,168 @@ class FileMetadata(BaseModel):
     def index_dir(self) -> str:
         return os.path.join(self.name, self.version)
 
-    async def save(self, index: str) -> None:
-        """Saves metadata to sidecar file
+    @property
+    def core_metadata_path(self) -> str:
+        """Path of the PEP 658 core metadata file served alongside the distribution"""
+        return self.index_path + ".metadata"
+
+    def extract_core_metadata(self, path: str) -> bytes:
+        """Returns the core metadata of a stored distribution: the wheel's `.dist-info/METADATA` verbatim, or
+        the output of `as_metadata()` for sdists & unreadable wheels
+
+        Args:
+            path (str): Path of the stored distribution file
+        """
+        if self.filename.endswith(".whl"):
+            try:
+                with zipfile.ZipFile(path) as wheel:
+                    for name in wheel.namelist():
+                        parts = name.split("/")
+                        if (
+                            len(parts) == 2
+                            and parts[0].endswith(".dist-info")
+                            and parts[1] == "METADATA"
+                        ):
+                            return wheel.read(name)
+            except (zipfile.BadZipFile, OSError):
+                pass
+
+        return self.as_metadata().encode()
+
+    def write_core_metadata(self, index: str) -> None:
+        """Writes the PEP 658 core metadata file of a stored distribution & records its sha256
+
+        Args:
+            index (str): Index root folder
+        """
+        data = self.extract_core_metadata(os.path.join(index, self.index_path))
+        write_atomic(os.path.join(index, self.core_metadata_path), data)
+        self.core_metadata_sha256 = hashlib.sha256(data).hexdigest()
+
+    def write_sidecar(self, index: str) -> None:
+        """Writes the metadata sidecar file of a stored distribution
+
+        Args:
+            index (str): Index root folder
+        """
+        write_atomic(os.path.join(index, self.metadata_path), self.model_dump_json())
+
+    def backfill_core_metadata(self, index: str) -> None:
+        """Writes the core metadata file of a distribution stored before it was generated at upload time, &
+        persists its sha256 to the sidecar & project manifest
+
+        Args:
+            index (str): Index root folder
+        """
+        self.write_core_metadata(index)
+        if self.size == None:
+            self.size = os.path.getsize(os.path.join(index, self.index_path))
+        self.write_sidecar(index)
+        ProjectManifest.record(os.path.join(index, self.name), self)
+
+    async def _stream(
+        self, index: str, target: str, digests: dict[str, Any], max_size: int | None
+    ) -> int:
+        """Copies the uploaded content to `target` via a temporary file, updating `digests` along the way
+
+        Returns:
+            int: Size of the content in bytes
+        """
+        handle, temp_path = tempfile.mkstemp(
+            dir=os.path.join(index, self.index_dir),
+            prefix="." + self.filename,
+            suffix=".part",
+        )
+        try:
+            size = 0
+            with os.fdopen(handle, "wb") as file:
+
+                def write_chunk(chunk: bytes) -> None:
+                    for digest in digests.values():
+                        digest.update(chunk)
+                    file.write(chunk)
+
+                await self.content.seek(0)
+                while chunk := await self.content.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_size != None and size > max_size:
+                        raise UploadTooLargeError(
+                            f"Uploaded file exceeds the maximum size of {max_size} bytes."
+                        )
+                    await anyio.to_thread.run_sync(write_chunk, chunk)
+
+            for field, digest in digests.items():
+                expected = getattr(self, field)
+                if expected and expected.lower() != digest.hexdigest():
+                    raise DigestMismatchError(
+                        f"Uploaded file does not match the provided {field.replace('_digest', '')} digest."
+                    )
+
+            try:
+                await anyio.to_thread.run_sync(publish_file, temp_path, target)
+            except FileExistsError:
+                raise FileExistsError("Cannot overwrite an existing version.")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            await self.content.close()
+        return size
+
+    async def save(self, index: str, max_size: int | None = None) -> None:
+        """Streams the uploaded content to the index & saves metadata to a sidecar file
+
+        The content is copied in fixed-size chunks to a temporary file in the version directory, which is
+        then linked into place so a partially-written file is never visible. The MD5, SHA256 & BLAKE2b-256
+        digests are computed in the same pass, checked against any client-supplied values & stored along
+        with the file size. If the upload fails, the project & version directories it created are removed.
 
         Args:
             index (str): Index root folder
+            max_size (int | None, optional): Maximum file size in bytes. Defaults to None (unlimited).
 
         Raises:
             FileExistsError: Raised if the version already exists or if no content was provided.
+            UploadTooLargeError: Raised if the content exceeds `max_size`.
+            DigestMismatchError: Raised if a client-supplied digest doesn't match the content.
         """
         if not self.content:
             raise FileExistsError("No content was provided")
 
-        if os.path.exists(os.path.join(index, self.index_path)):
+        target = os.path.join(index, self.index_path)
+        if os.path.exists(target):
             raise FileExistsError("Cannot overwrite an existing version.")
 
+        # Directories created by this upload, removed again (if still empty) when it fails
+        created = [
+            path
+            for path in [
+                os.path.join(index, self.name),
+                os.path.join(index, self.index_dir),
+            ]
+            if not os.path.isdir(path)
+        ]
         os.makedirs(os.path.join(index, self.index_dir), exist_ok=True)
+        digests = {
+            "md5_digest": hashlib.md5(),
+            "sha256_digest": hashlib.sha256(),
+            "blake2_256_digest": hashlib.blake2b(digest_size=32),
+        }
+        try:
+            size = await self._stream(index, target, digests, max_size)
+        except BaseException:
+            for path in reversed(created):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    pass
+            raise
 
-        with open(os.path.join(index, self.index_path), "wb") as file:
-            file.write(await self.content.read())
-
-        with open(os.path.join(index, self.metadata_path), "w") as file:
-            file.write(self.model_dump_json())
+        for field, digest in digests.items():
+            setattr(self, field, digest.hexdigest())
+        self.size = size
+        self.write_core_metadata(index)
+        self.write_sidecar(index)
+        ProjectManifest.record(os.path.join(index, self.name), self)
 
     @classmethod
     def get_files(cls, path: str) -> list["FileMetadata"]:
@@ -124,10 +293,8 @@ class FileMetadata(BaseModel):
 
     def as_metadata(self) -> str:
         """Converts to PYPA metadata format"""
-        output = ""
-        for key, value in self.model_dump(
-            mode="json", exclude={"index_path", "metadata_path", "index_dir"}
-        ).items():
+        lines = []
+        for key, value in self.model_dump(mode="json", exclude=NON_METADATA_FIELDS).items():
             if value:
                 if key in FIELD_MAP.keys():
                     field_name = FIELD_MAP[key]
@@ -135,8 +302,240 @@ class FileMetadata(BaseModel):
                     field_name = key.title().replace("_", "-")
 
                 if type(value) == list:
-                    for i in value:
-                        output += field_name + ": " + i + "\n"
+                    lines.extend([field_name + ": " + i for i in value])
                 else:
-                    output += field_name + ": " + str(value) + "\n"
-        return output
+                    lines.append(field_name + ": " + str(value))
+        return "".join([line + "\n" for line in lines])
+
+
+def publish_file(source: str, target: str) -> None:
+    """Makes a fully-written file visible at `target`, never overwriting an existing file
+
+    Hard-links the file into place, or copies it into a newly-created file where hard links aren't supported.
+
+    Raises:
+        FileExistsError: Raised if `target` already exists
+    """
+    try:
+        os.link(source, target)
+        return
+    except FileExistsError:
+        raise
+    except OSError:
+        pass
+
+    with open(source, "rb") as src, open(target, "xb") as dst:
+        try:
+            shutil.copyfileobj(src, dst)
+        except:
+            os.remove(target)
+            raise
+
+
+def write_atomic(path: str, data: str | bytes) -> None:
+    """Writes a file by replacing it with a fully-written temporary file in the same directory."""
+    directory, name = os.path.split(path)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix="." + name, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb" if isinstance(data, bytes) else "w") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ManifestFile(BaseModel):
+    """Compact record of a single distribution file, as stored in a project manifest."""
+
+    filename: str
+    version: str
+    metadata_version: str
+    protocol_version: int
+    filetype: Optional[str] = None
+    pyversion: Optional[str] = None
+    comment: Optional[str] = None
+    requires_python: Optional[str] = None
+    md5_digest: Optional[str] = None
+    sha256_digest: Optional[str] = None
+    blake2_256_digest: Optional[str] = None
+    size: Optional[int] = None
+    core_metadata_sha256: Optional[str] = None
+    upload_time: Optional[datetime] = None
+
+    @classmethod
+    def from_meta(cls, meta: FileMetadata, size: int | None = None) -> "ManifestFile":
+        return ManifestFile(
+            **meta.model_dump(include=set(cls.model_fields.keys()) - {"size"}),
+            size=size if size != None else meta.size,
+        )
+
+    def as_meta(self, name: str) -> FileMetadata:
+        """Returns a FileMetadata containing only the fields recorded in the manifest"""
+        return FileMetadata(name=name, **self.model_dump())
+
+
+class ProjectManifest(BaseModel):
+    """Per-project index of every version & file, stored as `.manifest.json` in the project directory.
+
+    Serving package listings from the manifest avoids listing every version directory & parsing every
+    metadata sidecar on each request. `serial` is incremented on every change, for use in HTTP validators.
+    """
+
+    FILENAME: ClassVar[str] = ".manifest.json"
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+    _serials: ClassVar[dict[str, tuple[int, int, int]]] = {}
+
+    name: str
+    serial: int = 0
+    versions: dict[str, list[ManifestFile]] = {}
+
+    @classmethod
+    def path(cls, project_path: str) -> str:
+        return os.path.join(project_path, cls.FILENAME)
+
+    @classmethod
+    def load(cls, project_path: str) -> "ProjectManifest | None":
+        """Loads an existing manifest
+
+        Args:
+            project_path (str): Project directory
+
+        Returns:
+            ProjectManifest | None: Manifest, or None if the project has no manifest yet
+        """
+        try:
+            with open(cls.path(project_path), "r") as f:
+                return ProjectManifest.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def rebuild(cls, project_path: str) -> "ProjectManifest":
+        """Regenerates & saves a project manifest from the metadata sidecars on disk
+
+        Args:
+            project_path (str): Project directory
+
+        Raises:
+            FileNotFoundError: Raised if the project directory does not exist
+
+        Returns:
+            ProjectManifest: Rebuilt manifest
+        """
+        if not os.path.isdir(project_path):
+            raise FileNotFoundError(f"Package directory '{project_path}' does not exist.")
+
+        previous = cls.load(project_path)
+        manifest = ProjectManifest(
+            name=os.path.basename(str(project_path).rstrip("/")),
+            serial=previous.serial + 1 if previous else 0,
+        )
+        for version in os.listdir(project_path):
+            version_path = os.path.join(project_path, version)
+            if version.startswith(".") or not os.path.isdir(version_path):
+                continue
+
+            for meta in FileMetadata.get_files(version_path):
+                manifest.name = meta.name
+                manifest.versions.setdefault(meta.version, []).append(
+                    ManifestFile.from_meta(
+                        meta,
+                        os.path.getsize(os.path.join(version_path, meta.filename)),
+                    )
+                )
+
+        manifest.save(project_path)
+        return manifest
+
+    @classmethod
+    def open(cls, project_path: str) -> "ProjectManifest":
+        """Loads a project manifest, rebuilding it if it doesn't exist yet
+
+        Raises:
+            FileNotFoundError: Raised if the project directory does not exist
+        """
+        if not os.path.isdir(project_path):
+            raise FileNotFoundError(f"Package directory '{project_path}' does not exist.")
+
+        manifest = cls.load(project_path)
+        if manifest == None:
+            with cls._lock:
+                manifest = cls.load(project_path) or cls.rebuild(project_path)
+        return manifest
+
+    @classmethod
+    def record(cls, project_path: str, meta: FileMetadata) -> None:
+        """Adds a newly-saved file to its project manifest
+
+        Args:
+            project_path (str): Project directory
+            meta (FileMetadata): Metadata of the saved file
+        """
+        with cls._lock:
+            manifest = cls.load(project_path)
+            if manifest == None:
+                cls.rebuild(project_path)
+                return
+
+            files = [
+                i
+                for i in manifest.versions.get(meta.version, [])
+                if i.filename != meta.filename
+            ]
+            files.append(ManifestFile.from_meta(meta))
+            manifest.versions[meta.version] = files
+            manifest.serial += 1
+            manifest.save(project_path)
+
+    @classmethod
+    def validator(cls, project_path: str) -> tuple[int, float] | None:
+        """Returns the change serial & modification time of a project, without parsing its manifest unless it
+        has been rewritten since the last call
+
+        Args:
+            project_path (str): Project directory
+
+        Returns:
+            tuple[int, float] | None: (serial, mtime), or None if the project does not exist
+        """
+        path = cls.path(str(project_path))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            try:
+                manifest = cls.open(str(project_path))
+            except FileNotFoundError:
+                return None
+            stat = os.stat(path)
+        else:
+            manifest = None
+
+        cached = cls._serials.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2], stat.st_mtime
+
+        manifest = manifest or cls.load(str(project_path))
+        if manifest == None:
+            return None
+        cls._serials[path] = (stat.st_mtime_ns, stat.st_size, manifest.serial)
+        return manifest.serial, stat.st_mtime
+
+    def save(self, project_path: str) -> None:
+        write_atomic(self.path(project_path), self.model_dump_json())
+
+    def ordered_versions(self) -> list[str]:
+        """Returns all versions, newest first"""
+
+        def sort_key(version: str):
+            try:
+                return (1, Version(version))
+            except InvalidVersion:
+                return (0, version)
+
+        return sorted(self.versions.keys(), key=sort_key, reverse=True)
+
+    def files(self) -> list[ManifestFile]:
+        """Returns every file across all versions, newest version first"""
+        return [file for version in self.ordered_versions() for file in self.versions[version]]
@@ -2,7 +2,7 @@ from datetime import datetime
 import os
 from typing import Any, Optional
 from pydantic import BaseModel, Field, computed_field, field_validator
-from .file_meta import FileMetadata
+from .file_meta import FileMetadata, ManifestFile, ProjectManifest
 from packaging.version import Version, parse
 
 class PackageInfo(BaseModel):
@@ -45,6 +45,7 @@ class PackageInfo(BaseModel):
 class PackageDigests(BaseModel):
     md5: Optional[str] = None
     sha256: Optional[str] = None
+    blake2b_256: Optional[str] = None
 
 
 class PackageUrl(BaseModel):
@@ -75,15 +76,38 @@ class PackageUrl(BaseModel):
             digests=PackageDigests(
                 md5=meta.md5_digest,
                 sha256=meta.sha256_digest,
+                blake2b_256=meta.blake2_256_digest,
             ),
             filename=meta.filename,
             packagetype=meta.filetype,
             python_version=meta.pyversion,
             requires_python=meta.requires_python,
+            size=meta.size,
             upload_time=meta.upload_time,
             url=f"{url_base}/files/{meta.name}/{meta.version}/{meta.filename}",
         )
 
+    @classmethod
+    def from_manifest(
+        cls, name: str, entry: ManifestFile, url_base: str
+    ) -> "PackageUrl":
+        """Generates from a project manifest entry"""
+        return PackageUrl(
+            comment_text=entry.comment,
+            digests=PackageDigests(
+                md5=entry.md5_digest,
+                sha256=entry.sha256_digest,
+                blake2b_256=entry.blake2_256_digest,
+            ),
+            filename=entry.filename,
+            packagetype=entry.filetype,
+            python_version=entry.pyversion,
+            requires_python=entry.requires_python,
+            size=entry.size,
+            upload_time=entry.upload_time,
+            url=f"{url_base}/files/{name}/{entry.version}/{entry.filename}",
+        )
+
 
 class APIMeta(BaseModel):
     api_version: str = Field(serialization_alias="api-version", default="1.1")
@@ -110,6 +134,7 @@ class PackageFileDetail(BaseModel):
     )
     gpg_sig: Optional[bool] = Field(serialization_alias="gpg-sig", default=None)
     yanked: Optional[str | bool] = None
+    size: Optional[int] = None
 
     @classmethod
     def from_meta(cls, meta: FileMetadata, url_base: str) -> "PackageFileDetail":
@@ -120,9 +145,37 @@ class PackageFileDetail(BaseModel):
             hashes=PackageDigests(
                 md5=meta.md5_digest,
                 sha256=meta.sha256_digest,
+                blake2b_256=meta.blake2_256_digest,
             ),
             requires_python=meta.requires_python,
-            dist_info_meta=True,
+            dist_info_meta=(
+                {"sha256": meta.core_metadata_sha256}
+                if meta.core_metadata_sha256
+                else True
+            ),
+            size=meta.size,
+        )
+
+    @classmethod
+    def from_manifest(
+        cls, name: str, entry: ManifestFile, url_base: str
+    ) -> "PackageFileDetail":
+        """Generates from a project manifest entry"""
+        return PackageFileDetail(
+            filename=entry.filename,
+            url=f"{url_base}/files/{name}/{entry.version}/{entry.filename}",
+            hashes=PackageDigests(
+                md5=entry.md5_digest,
+                sha256=entry.sha256_digest,
+                blake2b_256=entry.blake2_256_digest,
+            ),
+            requires_python=entry.requires_python,
+            dist_info_meta=(
+                {"sha256": entry.core_metadata_sha256}
+                if entry.core_metadata_sha256
+                else True
+            ),
+            size=entry.size,
         )
 
 
@@ -131,6 +184,45 @@ class PackageDetail(BaseModel):
     name: str
     files: list[PackageFileDetail]
 
+    @classmethod
+    def from_manifest(
+        cls, manifest: ProjectManifest, url_base: str = "http://localhost:8000"
+    ) -> "PackageDetail":
+        """Generates the simple API project detail directly from a project manifest
+
+        Args:
+            manifest (ProjectManifest): Project manifest
+            url_base (str, optional): File download base URL. Defaults to "http://localhost:8000".
+
+        Returns:
+            PackageDetail: Generated PackageDetail object
+        """
+        return PackageDetail(
+            meta=APIMeta(),
+            name=manifest.name,
+            files=[
+                PackageFileDetail.from_manifest(manifest.name, entry, url_base)
+                for entry in manifest.files()
+            ],
+        )
+
+    def merge(self, upstream: "PackageDetail") -> "PackageDetail":
+        """Appends the files of an upstream project detail, skipping filenames already listed (local files win)
+
+        Args:
+            upstream (PackageDetail): Upstream project detail
+
+        Returns:
+            PackageDetail: Merged project detail
+        """
+        filenames = {file.filename for file in self.files}
+        return PackageDetail(
+            meta=self.meta,
+            name=self.name,
+            files=self.files
+            + [file for file in upstream.files if not file.filename in filenames],
+        )
+
 
 class Package(BaseModel):
     info: PackageInfo
@@ -154,35 +246,40 @@ class Package(BaseModel):
             url_base (str, optional): URL base for downloads. Defaults to "http://localhost:8000".
 
         Raises:
+            FileNotFoundError: Raised if the package is unknown
             KeyError: Raised if version is unknown
 
         Returns:
             Package: Assembled Package
         """
-
-        # Order version & select requested/latest
-        version_paths = {
-            ver: os.path.join(package_path, ver) for ver in os.listdir(package_path)
-        }
-        versions = {
-            ver: FileMetadata.get_files(path) for ver, path in version_paths.items()
-        }
-        ordered_versions = [
-            str(i)
-            for i in sorted([Version(ver) for ver in versions.keys()], reverse=True)
-        ]
+        manifest = ProjectManifest.open(package_path)
+        ordered_versions = manifest.ordered_versions()
         if version:
-            if not version in versions.keys():
+            if not version in manifest.versions.keys():
                 raise KeyError(f"Unknown version {version}")
         else:
+            if len(ordered_versions) == 0:
+                raise FileNotFoundError(f"Package '{package_path}' has no versions.")
             version = ordered_versions[0]
 
-        info = PackageInfo(**versions[version][0].model_dump())
-        urls = [PackageUrl.from_meta(meta, url_base) for meta in versions[version]]
+        # Only the selected version needs its full metadata sidecar
+        selected = manifest.versions[version]
+        with open(
+            os.path.join(package_path, version, selected[0].filename + ".json"), "r"
+        ) as f:
+            info = PackageInfo(**FileMetadata.model_validate_json(f.read()).model_dump())
+
+        urls = [
+            PackageUrl.from_manifest(manifest.name, entry, url_base)
+            for entry in selected
+        ]
         return Package(
             info=info,
             urls=urls,
-            versions=[(version, versions[version]) for version in ordered_versions],
+            versions=[
+                (ver, [entry.as_meta(manifest.name) for entry in manifest.versions[ver]])
+                for ver in ordered_versions
+            ],
         )
 
     def detail(self, url_base: str = "http://localhost:8000") -> PackageDetail:
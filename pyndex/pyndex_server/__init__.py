@@ -9,6 +9,7 @@ from litestar.di import Provide
 from .config import Config
 from .context import Context
 from .routes import make_api_router
+from .timing import timing_middleware
 
 CONFIG = Config.load()
 
@@ -16,6 +17,11 @@ CONFIG = Config.load()
 async def on_start(app: Litestar):
     conf = Config.load()
     app.state.context = Context(conf)
+    app.state.context.open()
+
+
+async def on_shutdown(app: Litestar):
+    await app.state.context.close()
 
 
 async def provide_context(state: State) -> Context:
@@ -41,4 +47,7 @@ app = Litestar(
     dependencies={"context": Provide(provide_context)},
     exception_handlers={HTTP_500_INTERNAL_SERVER_ERROR: plain_text_exception_handler},
     on_startup=[on_start],
+    on_shutdown=[on_shutdown],
+    middleware=[timing_middleware],
+    request_max_body_size=CONFIG.storage.max_request_size,
 )
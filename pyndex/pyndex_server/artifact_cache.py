@@ -0,0 +1,110 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import AsyncIterator
+from urllib.parse import quote
+import anyio
+from httpx import AsyncClient, Response
+from .models import Package, PackageDetail
+from .timing import record_event
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ArtifactCache:
+    """Content-addressed cache of proxied distribution files, stored as `<root>/<sha256[:2]>/<sha256>`.
+
+    Proxied file URLs are rewritten to the `/mirror/{sha256}/{filename}` route & their upstream location is
+    remembered in memory. The first download streams the upstream file to the client while writing it to
+    a temporary file & hashing it; the file is only added to the cache if its sha256 matches.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.sources: dict[str, tuple[str, str]] = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def remember(self, sha256: str | None, proxy: str, url: str) -> str | None:
+        """Records the upstream location of a file & returns its normalized sha256, or None if the hash is unusable"""
+        sha256 = sha256.lower() if sha256 else None
+        if not sha256 or not SHA256_PATTERN.match(sha256):
+            return None
+        self.sources[sha256] = (proxy, url)
+        return sha256
+
+    def source(self, sha256: str) -> tuple[str, str] | None:
+        """Returns the (proxy name, URL) a file was last listed at"""
+        return self.sources.get(sha256)
+
+    def mirror_url(self, url_base: str, sha256: str, filename: str) -> str:
+        return f"{str(url_base).rstrip('/')}/mirror/{sha256}/{quote(filename)}"
+
+    def rewrite_detail(
+        self, detail: PackageDetail, proxy: str, url_base: str
+    ) -> PackageDetail:
+        """Points the file URLs of a proxied simple-API response at the mirror route"""
+        for file in detail.files:
+            sha256 = self.remember(file.hashes.sha256, proxy, file.url)
+            if sha256:
+                file.url = self.mirror_url(url_base, sha256, file.filename)
+        return detail
+
+    def rewrite_package(self, package: Package, proxy: str, url_base: str) -> Package:
+        """Points the file URLs of a proxied JSON-API response at the mirror route"""
+        for url in package.urls:
+            sha256 = self.remember(url.digests.sha256, proxy, url.url)
+            if sha256:
+                url.url = self.mirror_url(url_base, sha256, url.filename)
+        return package
+
+    async def open_upstream(self, client: AsyncClient, url: str) -> Response:
+        """Starts a streaming upstream request; the caller must pass it to `tee()` or close it."""
+        return await client.send(client.build_request("GET", url), stream=True)
+
+    async def tee(self, sha256: str, response: Response) -> AsyncIterator[bytes]:
+        """Yields the body of a streaming upstream response while writing it to the cache
+
+        The file is hashed as it is written & only moved into place if its sha256 matches. The last chunk is
+        held back until the digest is verified, so a mismatch aborts the response short of its
+        `content-length` & the client never receives a complete-looking body.
+
+        Args:
+            sha256 (str): Expected sha256
+            response (Response): Streaming upstream response
+
+        Yields:
+            bytes: Body chunks
+        """
+        os.makedirs(os.path.dirname(self.path(sha256)), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path(sha256)), prefix="." + sha256, suffix=".part"
+        )
+        digest = hashlib.sha256()
+        pending: bytes | None = None
+        try:
+            with os.fdopen(handle, "wb") as file:
+                async for chunk in response.aiter_bytes():
+                    digest.update(chunk)
+                    await anyio.to_thread.run_sync(file.write, chunk)
+                    if pending != None:
+                        yield pending
+                    pending = chunk
+
+            if digest.hexdigest() != sha256:
+                record_event(None, "mirror-hash-mismatch")
+                raise ValueError(
+                    f"Upstream file does not match its listed sha256 digest {sha256}."
+                )
+
+            os.replace(temp_path, self.path(sha256))
+            record_event(None, "mirror-stored")
+            if pending != None:
+                yield pending
+        finally:
+            await response.aclose()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
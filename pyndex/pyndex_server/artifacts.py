@@ -0,0 +1,217 @@
+import os
+from typing import Any
+import anyio
+from litestar import Request, Response
+from litestar.exceptions import HTTPException
+from litestar.response.base import ASGIResponse
+from litestar.status_codes import (
+    HTTP_200_OK,
+    HTTP_206_PARTIAL_CONTENT,
+    HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+)
+from litestar.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+
+# Uploaded versions can never be overwritten, so artifacts may be cached indefinitely
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def artifact_etag(sha256: str | None, stat: os.stat_result) -> str:
+    """Returns a strong ETag derived from the stored sha256, or a weak one from the file's stat if unknown."""
+    if sha256:
+        return f'"{sha256}"'
+    return f'W/"{int(stat.st_mtime)}-{stat.st_size}"'
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parses a single-range `Range` header into an inclusive byte span
+
+    Multi-range, non-byte & syntactically invalid requests (e.g. `bytes=5-3`) are served as a whole, as
+    required or permitted by RFC 9110.
+
+    Args:
+        header (str | None): `Range` header value
+        size (int): Total size of the resource
+
+    Raises:
+        HTTPException: 416 if the range cannot be satisfied
+
+    Returns:
+        tuple[int, int] | None: (first, last) byte positions, or None to serve the whole file
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header.removeprefix("bytes=").strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and start > end:
+                return None
+        elif last:
+            suffix = int(last)
+            start = max(0, size - suffix) if suffix > 0 else size
+            end = size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range cannot be satisfied.",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+def requested_range(
+    request: Request, size: int, etag: str
+) -> tuple[int, int] | None:
+    """Returns the byte span to serve for a request's `Range` & `If-Range` headers
+
+    `If-Range` requires a strong comparison (RFC 9110), so a conditional range request against a weak
+    ETag always gets the whole file.
+
+    Args:
+        request (Request): HTTP request object
+        size (int): Total size of the resource
+        etag (str): Current ETag
+
+    Returns:
+        tuple[int, int] | None: (first, last) byte positions, or None to serve the whole file
+    """
+    if_range = request.headers.get("if-range")
+    if if_range != None and (etag.startswith("W/") or if_range.strip() != etag):
+        return None
+    return parse_range(request.headers.get("range"), size)
+
+
+class ArtifactResponse(ASGIResponse):
+    """Serves a (range of a) stored artifact.
+
+    Uses the ASGI `http.response.zerocopysend` extension (sendfile) when the server advertises it, and
+    otherwise streams the file in chunks read from a worker thread.
+    """
+
+    __slots__ = ("path", "offset", "count", "zerocopy")
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        filename: str | None,
+        etag: str,
+        byte_range: tuple[int, int] | None = None,
+        headers: dict[str, str] | None = None,
+        is_head_response: bool = False,
+        media_type: str = "application/octet-stream",
+    ) -> None:
+        self.path = path
+        self.offset, last = byte_range if byte_range else (0, size - 1)
+        self.count = max(0, last - self.offset + 1)
+        self.zerocopy = False
+
+        super().__init__(
+            content_length=self.count,
+            headers={
+                "accept-ranges": "bytes",
+                "etag": etag,
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+                **(
+                    {"content-disposition": f'attachment; filename="{filename}"'}
+                    if filename
+                    else {}
+                ),
+                **(headers or {}),
+                **(
+                    {"content-range": f"bytes {self.offset}-{last}/{size}"}
+                    if byte_range
+                    else {}
+                ),
+            },
+            is_head_response=is_head_response,
+            media_type=media_type,
+            status_code=HTTP_206_PARTIAL_CONTENT if byte_range else HTTP_200_OK,
+        )
+
+    async def send_body(self, send: Send, receive: Receive) -> None:
+        with open(self.path, "rb") as file:
+            if self.zerocopy:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file.fileno(),
+                        "offset": self.offset,
+                        "count": self.count,
+                        "more_body": False,
+                    }
+                )
+                return
+
+            position, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, file.fileno(), min(CHUNK_SIZE, remaining), position
+                )
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0 or self.count == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+
+class Artifact(Response):
+    """Handler-level response for a stored artifact, converted to an `ArtifactResponse` when sent."""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        filename: str | None,
+        etag: str,
+        byte_range: tuple[int, int] | None = None,
+        headers: dict[str, str] | None = None,
+        media_type: str = "application/octet-stream",
+    ) -> None:
+        super().__init__(content=None, headers=headers, media_type=media_type)
+        self.path = path
+        self.size = size
+        self.filename = filename
+        self.etag = etag
+        self.byte_range = byte_range
+
+    def to_asgi_response(
+        self,
+        app: Any,
+        request: Request,
+        *,
+        headers: dict[str, str] | None = None,
+        is_head_response: bool = False,
+        **kwargs: Any,
+    ) -> ArtifactResponse:
+        return ArtifactResponse(
+            self.path,
+            self.size,
+            self.filename,
+            self.etag,
+            byte_range=self.byte_range,
+            headers={**(headers or {}), **self.headers},
+            is_head_response=is_head_response,
+            media_type=self.media_type,
+        )
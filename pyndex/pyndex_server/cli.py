@@ -1,5 +1,7 @@
+import os
 import click
-from . import app
+from . import app, CONFIG
+from ..common import ProjectManifest
 from hypercorn.config import Config
 from hypercorn.asyncio import serve
 import asyncio
@@ -27,9 +29,26 @@ import asyncio
     type=click.Path(exists=True, dir_okay=False),
     help="Private key file for SSL encryption. If not provided, server will use HTTP.",
 )
+@click.option(
+    "--rebuild-manifests",
+    "rebuild_manifests",
+    is_flag=True,
+    help="Rebuild every project manifest from the metadata sidecars in storage, then exit.",
+)
 def launch(
-    bind: str, insecure_bind: str | None, certfile: str | None, keyfile: str | None
+    bind: str,
+    insecure_bind: str | None,
+    certfile: str | None,
+    keyfile: str | None,
+    rebuild_manifests: bool,
 ):
+    if rebuild_manifests:
+        index = os.path.join(CONFIG.storage.root, "index")
+        for project in sorted(os.listdir(index)):
+            manifest = ProjectManifest.rebuild(os.path.join(index, project))
+            click.echo(f"{manifest.name}: {len(manifest.files())} file(s)")
+        return
+
     config = Config()
     config.bind = [bind]
 
@@ -0,0 +1,73 @@
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+from typing import Any
+from litestar import Request, Response
+from litestar.status_codes import HTTP_304_NOT_MODIFIED
+
+
+def principal_key(auth: Any) -> str:
+    """Identifies the requesting principal, so that validators are never shared between principals."""
+    if auth == None:
+        return "anonymous"
+    return f"{type(auth).__name__}:{auth.id}"
+
+
+def make_etag(*parts: Any) -> str:
+    """Builds a weak ETag from the values a response depends on."""
+    digest = hashlib.sha256("\x1f".join([str(i) for i in parts]).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def validator_headers(etag: str, last_modified: float | None = None) -> dict[str, str]:
+    """Returns the caching headers to send with a (possibly not-modified) response
+
+    Responses are private & must be revalidated, since their content depends on the requesting principal.
+    """
+    headers = {
+        "etag": etag,
+        "cache-control": "private, no-cache",
+        "vary": "Authorization",
+    }
+    if last_modified != None:
+        headers["last-modified"] = format_datetime(
+            datetime.fromtimestamp(int(last_modified), tz=UTC), usegmt=True
+        )
+    return headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: float | None = None
+) -> bool:
+    """Evaluates `If-None-Match` (or, in its absence, `If-Modified-Since`) against a response's validators
+
+    Args:
+        request (Request): HTTP request object
+        etag (str): Current ETag
+        last_modified (float | None, optional): Current modification timestamp. Defaults to None.
+
+    Returns:
+        bool: True if the client's cached copy is still current
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match != None:
+        tags = [i.strip().removeprefix("W/") for i in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified != None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def not_modified(etag: str, last_modified: float | None = None) -> Response:
+    """Returns an empty `304 Not Modified` response carrying the current validators."""
+    return Response(
+        content=None,
+        status_code=HTTP_304_NOT_MODIFIED,
+        headers=validator_headers(etag, last_modified),
+    )
@@ -1,11 +1,32 @@
 import os
 import tomllib
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from packaging.utils import canonicalize_name
+from pydantic import BaseModel, Field, model_validator
+
+
+class ProxyCacheConfig(BaseModel):
+    enabled: bool = True
+    ttl: float = 600.0
+    stale_ttl: float = 86400.0
+    max_size: int = 1024**3
+    negative_ttl: float = 60.0
+    negative_max_entries: int = 10000
 
 
 class StorageConfig(BaseModel):
     root: str
+    engine: Literal["sqlite", "tinydb"] = "sqlite"
+    cache_size: int = 4096
+    max_upload_size: int | None = 1024**3
+    proxy_cache: ProxyCacheConfig = Field(default_factory=ProxyCacheConfig)
+
+    @property
+    def max_request_size(self) -> int | None:
+        """Request body limit: the maximum file size plus room for multipart form metadata"""
+        if self.max_upload_size == None:
+            return None
+        return self.max_upload_size + 16 * 1024**2
 
 
 class ApiConfig(BaseModel):
@@ -17,17 +38,60 @@ class ProxyItemUrls(BaseModel):
     package: Optional[str] = None
 
 
+class ProxyClientConfig(BaseModel):
+    max_connections: int | None = 20
+    max_keepalive_connections: int | None = 10
+    keepalive_expiry: float | None = 30.0
+    connect_timeout: float | None = 5.0
+    read_timeout: float | None = 30.0
+    write_timeout: float | None = 30.0
+    pool_timeout: float | None = 5.0
+    http2: bool = False
+
+
 class ProxyItemConfig(BaseModel):
     name: str
     priority: int
     username: Optional[str] = None
     password: Optional[str] = None
     urls: ProxyItemUrls
+    client: ProxyClientConfig = Field(default_factory=ProxyClientConfig)
+
+
+class ProxyResolutionConfig(BaseModel):
+    mode: Literal["sequential", "hedged", "concurrent"] = "sequential"
+    hedge_delay: float = 0.5
+    priority_wait: float = 0.25
+
+
+class ProxyHealthConfig(BaseModel):
+    window: int = 20
+    min_requests: int = 5
+    error_threshold: float = 0.5
+    cooldown: float = 30.0
+    ewma_alpha: float = 0.2
+
+
+class ProxyPrefetchConfig(BaseModel):
+    enabled: bool = False
+    max_depth: int = 2
+    concurrency: int = 4
+    max_pending: int = 256
+    ttl: float = 600.0
+    max_entries: int = 10000
 
 
 class FeatureConfig(BaseModel):
     proxy: bool = True
     auth: bool = True
+    pull_through: bool = False
+    offline: bool = False
+    merge_upstream: list[str] = []
+
+    def merges_upstream(self, project_name: str) -> bool:
+        """Checks whether the simple-API view of a local project also lists its upstream files"""
+        projects = [canonicalize_name(i) for i in self.merge_upstream]
+        return "*" in projects or canonicalize_name(project_name) in projects
 
 
 class AuthAdminConfig(BaseModel):
@@ -36,17 +100,47 @@ class AuthAdminConfig(BaseModel):
     enabled: bool = True
 
 
+class AuthCacheConfig(BaseModel):
+    ttl: float = 60.0
+    max_entries: int = 1024
+
+
 class AuthenticationConfig(BaseModel):
     admin: AuthAdminConfig | None = None
+    cache: AuthCacheConfig = Field(default_factory=AuthCacheConfig)
+    hash_workers: int = 2
 
 
 class Config(BaseModel):
     storage: StorageConfig
     api: ApiConfig
     proxy: dict[str, ProxyItemConfig] = {}
+    proxy_resolution: ProxyResolutionConfig = Field(
+        default_factory=ProxyResolutionConfig
+    )
+    proxy_health: ProxyHealthConfig = Field(default_factory=ProxyHealthConfig)
+    proxy_prefetch: ProxyPrefetchConfig = Field(default_factory=ProxyPrefetchConfig)
     features: FeatureConfig = Field(default_factory=FeatureConfig)
     auth: AuthenticationConfig
 
+    @model_validator(mode="after")
+    def check_proxies(self) -> "Config":
+        names = [i.name for i in self.proxy.values()]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(
+                f"Proxy names must be unique (duplicated: {', '.join(duplicates)})."
+            )
+        return self
+
+    @model_validator(mode="after")
+    def check_features(self) -> "Config":
+        if self.features.merge_upstream and not self.storage.proxy_cache.enabled:
+            raise ValueError(
+                "features.merge_upstream requires storage.proxy_cache to be enabled."
+            )
+        return self
+
     @classmethod
     def load(cls) -> "Config":
         with open(os.getenv("PYNDEX_CONFIG", "./config.toml"), "rb") as config:
@@ -2,7 +2,10 @@ import os
 import pathlib
 from .config import Config
 from .models import *
-import tinydb
+from .artifact_cache import ArtifactCache
+from .prefetch import Prefetcher
+from .proxy_cache import NegativeCache, ProxyCache
+from .upstream import UpstreamClients
 
 
 class Context:
@@ -12,5 +15,61 @@ class Context:
         os.makedirs(self.config.storage.root, exist_ok=True)
         self.root = pathlib.Path(self.config.storage.root)
         self.root.joinpath("index").mkdir(exist_ok=True, parents=True)
-        self.db = tinydb.TinyDB(str(self.root.joinpath("pyndex.json")))
-        initialize(self.db, [AuthGroup, AuthToken, AuthUser, AuthPermission])
+        self.db = open_engine(str(self.root), self.config.storage.engine)
+        initialize(
+            self.db,
+            [AuthGroup, AuthToken, AuthUser, AuthPermission],
+            cache_size=self.config.storage.cache_size,
+        )
+        AuthUser.set_credential_cache(
+            CredentialCache(
+                ttl=self.config.auth.cache.ttl,
+                capacity=self.config.auth.cache.max_entries,
+            )
+        )
+        self.hasher = PasswordHasher(workers=self.config.auth.hash_workers)
+        cache_config = self.config.storage.proxy_cache
+        self.upstream = UpstreamClients(
+            self.config.proxies,
+            cache=(
+                ProxyCache(
+                    str(self.root.joinpath("proxy-cache")),
+                    ttl=cache_config.ttl,
+                    stale_ttl=cache_config.stale_ttl,
+                    max_size=cache_config.max_size,
+                )
+                if cache_config.enabled
+                else None
+            ),
+            missing=(
+                NegativeCache(
+                    ttl=cache_config.negative_ttl,
+                    capacity=cache_config.negative_max_entries,
+                )
+                if cache_config.enabled
+                else None
+            ),
+            resolution=self.config.proxy_resolution,
+            health=self.config.proxy_health,
+            offline=self.config.features.offline,
+        )
+        self.artifacts = (
+            ArtifactCache(str(self.root.joinpath("artifact-cache")))
+            if self.config.features.pull_through
+            else None
+        )
+
+        self.prefetcher = (
+            Prefetcher(self.upstream, self.config.proxy_prefetch)
+            if self.config.proxy_prefetch.enabled and self.upstream.cache
+            else None
+        )
+
+    def open(self) -> None:
+        self.upstream.open()
+
+    async def close(self) -> None:
+        self.hasher.close()
+        if self.prefetcher:
+            await self.prefetcher.close()
+        await self.upstream.close()
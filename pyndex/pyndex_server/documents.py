@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import os
+from typing import Any, Callable
+import anyio
+from litestar import Request, Response
+from litestar.serialization import encode_json, get_serializer
+from ..common.models.file_meta import write_atomic
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Stored content-codings, in order of preference
+ENCODINGS: dict[str, tuple[str, Callable[[bytes], bytes]]] = {
+    **(
+        {"br": (".br", lambda data: brotli.compress(data, quality=11))}
+        if brotli
+        else {}
+    ),
+    "gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+}
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Picks the preferred stored content-coding acceptable to the client
+
+    Args:
+        accept_encoding (str | None): `Accept-Encoding` header value
+
+    Returns:
+        str | None: Content-coding, or None to send the identity representation
+    """
+    if not accept_encoding:
+        return None
+
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for coding in ENCODINGS.keys():
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class ProjectDocuments:
+    """Rendered & precompressed API documents of a project, stored in `.documents/` next to its manifest.
+
+    Documents are keyed by kind (e.g. "simple" or "detail"), a key covering whatever else the content
+    depends on (base URL, version) & the revision of the project's manifest. Each is written once per
+    revision in the identity & every available compressed coding, and superseded revisions are removed
+    when it is rewritten. As keys depend on request data (the base URL), at most `MAX_KEYS` documents are
+    kept per project & the least recently written ones are evicted first.
+    """
+
+    DIRECTORY = ".documents"
+    MAX_KEYS = 256
+
+    def __init__(self, project_path: str) -> None:
+        self.root = os.path.join(str(project_path), self.DIRECTORY)
+
+    def _path(self, kind: str, key: str, revision: str) -> str:
+        return os.path.join(self.root, f"{kind}-{key}-{revision}.json")
+
+    def read(
+        self, kind: str, key: str, revision: str, encoding: str | None
+    ) -> bytes | None:
+        """Reads a stored document in the given content-coding, or returns None if it hasn't been rendered"""
+        suffix = ENCODINGS[encoding][0] if encoding else ""
+        try:
+            with open(self._path(kind, key, revision) + suffix, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(
+        self, kind: str, key: str, revision: str, data: bytes
+    ) -> dict[str | None, bytes]:
+        """Stores a rendered document & its compressed variants, removing those of older revisions
+
+        Returns:
+            dict[str | None, bytes]: Stored representations by content-coding (None for identity)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(kind, key, revision)
+        variants: dict[str | None, bytes] = {}
+        for encoding, (suffix, compress) in ENCODINGS.items():
+            variants[encoding] = compress(data)
+            write_atomic(path + suffix, variants[encoding])
+        variants[None] = data
+        write_atomic(path, data)
+
+        prefix = f"{kind}-{key}-"
+        documents: dict[str, list[str]] = {}
+        for name in os.listdir(self.root):
+            if name.startswith(prefix) and not name.startswith(
+                os.path.basename(path)
+            ):
+                self._remove(name)
+            elif not name.startswith("."):
+                documents.setdefault(name.rsplit("-", 1)[0], []).append(name)
+
+        if len(documents) > self.MAX_KEYS:
+            written = {
+                document: max([self._mtime(name) for name in names])
+                for document, names in documents.items()
+            }
+            for document in sorted(written.keys(), key=lambda x: written[x])[
+                : len(documents) - self.MAX_KEYS
+            ]:
+                for name in documents[document]:
+                    self._remove(name)
+        return variants
+
+    def _mtime(self, name: str) -> float:
+        try:
+            return os.stat(os.path.join(self.root, name)).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def _remove(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+
+def document_key(*parts: Any) -> str:
+    """Derives a filename-safe document key from the values its content depends on."""
+    return hashlib.sha256("\x1f".join([str(i) for i in parts]).encode()).hexdigest()[:16]
+
+
+async def serve_document(
+    request: Request,
+    project_path: str,
+    kind: str,
+    key: str,
+    revision: str,
+    render: Callable[[], Any],
+    headers: dict[str, str] | None = None,
+    media_type: str = "application/json",
+) -> Response:
+    """Sends a stored project document in the client's preferred content-coding, rendering it first if needed
+
+    Rendering & compression run in a worker thread, as large documents can take a while to compress.
+
+    Args:
+        request (Request): HTTP request object
+        project_path (str): Project directory
+        kind (str): Document kind
+        key (str): Document key (see `document_key()`)
+        revision (str): Current revision of the project's manifest
+        render (Callable[[], Any]): Returns the response model if the document must be rendered (called in a worker thread)
+        headers (dict[str, str] | None, optional): Additional response headers. Defaults to None.
+        media_type (str, optional): Response media type. Defaults to "application/json".
+
+    Returns:
+        Response: Encoded document
+    """
+    documents = ProjectDocuments(project_path)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    body = documents.read(kind, key, revision, encoding)
+    if body == None:
+        serializer = get_serializer(request.route_handler.resolve_type_encoders())
+
+        def render_document() -> bytes:
+            data = encode_json(render(), serializer=serializer)
+            return documents.write(kind, key, revision, data)[encoding]
+
+        body = await anyio.to_thread.run_sync(render_document)
+
+    response_headers = {**(headers or {})}
+    response_headers["vary"] = ", ".join(
+        [i for i in ["Accept-Encoding", response_headers.get("vary")] if i]
+    )
+    if encoding:
+        response_headers["content-encoding"] = encoding
+    return Response(body, headers=response_headers, media_type=media_type)
@@ -0,0 +1,143 @@
+from collections import deque
+import time
+from typing import Literal
+from pydantic import BaseModel
+from .config import ProxyHealthConfig
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting an upstream whose circuit breaker is open"""
+
+
+class UpstreamHealthStats(BaseModel):
+    name: str
+    state: Literal["closed", "open", "half_open"]
+    error_rate: float
+    latency_ewma_ms: float | None
+    successes: int
+    failures: int
+    rejected: int
+    opened: int
+    last_error: str | None
+    retry_in: float | None
+
+
+class UpstreamHealth:
+    """Health of a single upstream & its circuit breaker.
+
+    The error rate is measured over the last `window` requests. Once at least `min_requests` were made and
+    the rate reaches `error_threshold`, the breaker opens & requests are rejected for `cooldown` seconds.
+    After that, a single probe request is let through (half-open): success closes the breaker, failure
+    opens it again. Latency is tracked as an exponentially weighted moving average.
+    """
+
+    def __init__(self, name: str, config: ProxyHealthConfig | None = None) -> None:
+        config = config or ProxyHealthConfig()
+        self.name = name
+        self.min_requests = config.min_requests
+        self.error_threshold = config.error_threshold
+        self.cooldown = config.cooldown
+        self.ewma_alpha = config.ewma_alpha
+        self.outcomes: deque[bool] = deque(maxlen=max(1, config.window))
+        self.state: Literal["closed", "open", "half_open"] = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.latency_ewma: float | None = None
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_error: str | None = None
+
+    @property
+    def error_rate(self) -> float:
+        if len(self.outcomes) == 0:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def available(self) -> bool:
+        """Whether the breaker would currently let a request through (without claiming the probe slot)"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not (self.state == "half_open" and self.probing)
+
+    def allow(self) -> tuple[bool, bool]:
+        """Checks whether a request may be sent, claiming the probe slot if the breaker is half-open
+
+        Returns:
+            tuple[bool, bool]: Whether the request may be sent, & whether it holds the probe slot
+        """
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self.probing = False
+
+        if self.state == "closed":
+            return True, False
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True, True
+
+        self.rejected += 1
+        return False, False
+
+    def release(self) -> None:
+        """Gives up the probe slot without an outcome (e.g. the request was cancelled)
+
+        Must only be called by the request that claimed the slot in `allow()`.
+        """
+        self.probing = False
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.probing = False
+        self.opened += 1
+
+    def record(self, success: bool, seconds: float, error: str | None = None) -> None:
+        """Records the outcome & latency of a request"""
+        milliseconds = seconds * 1000
+        self.latency_ewma = (
+            milliseconds
+            if self.latency_ewma == None
+            else self.ewma_alpha * milliseconds + (1 - self.ewma_alpha) * self.latency_ewma
+        )
+        self.outcomes.append(success)
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+            self.last_error = error
+
+        if self.state == "half_open":
+            if success:
+                self.state = "closed"
+                self.probing = False
+                self.outcomes.clear()
+            else:
+                self._open()
+        elif (
+            self.state == "closed"
+            and not success
+            and len(self.outcomes) >= self.min_requests
+            and self.error_rate >= self.error_threshold
+        ):
+            self._open()
+
+    def stats(self) -> UpstreamHealthStats:
+        return UpstreamHealthStats(
+            name=self.name,
+            state=self.state,
+            error_rate=self.error_rate,
+            latency_ewma_ms=self.latency_ewma,
+            successes=self.successes,
+            failures=self.failures,
+            rejected=self.rejected,
+            opened=self.opened,
+            last_error=self.last_error,
+            retry_in=(
+                max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+                if self.state == "open"
+                else None
+            ),
+        )
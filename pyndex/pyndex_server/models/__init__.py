@@ -1,4 +1,7 @@
 from .base import BaseObject, initialize
+from .cache import ObjectCache, CredentialCache, CacheStats
+from .hashing import PasswordHasher, HasherStats, hash_password
+from .storage import StorageEngine, SQLiteEngine, TinyDBEngine, open_engine, migrate_tinydb
 from ...common.models.file_meta import *
 from ...common.models.package import *
 from .auth import *
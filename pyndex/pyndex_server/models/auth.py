@@ -1,15 +1,18 @@
 import base64
-from functools import cached_property
-from hashlib import pbkdf2_hmac
 import os
+import time
 from secrets import token_urlsafe
-from typing import Any, Callable, Literal
+from typing import Any, Callable, ClassVar, Literal
 
 from litestar import Request
 from pydantic import BaseModel, Field
 from tinydb import where
 
 from .base import BaseObject
+from .cache import CredentialCache
+from .hashing import PasswordHasher, hash_password
+from .permissions import EffectivePermissions, PermissionTable
+from ..timing import record_event, record_timing
 from litestar.connection import ASGIConnection
 from litestar.exceptions import *
 from litestar.handlers.base import BaseRouteHandler
@@ -38,60 +41,38 @@ class AuthBase:
                     perms.extend(group.permissions(project=project))
         return perms
 
-    @cached_property
+    def effective_permissions(self) -> EffectivePermissions:
+        """Returns the materialized permissions of this principal, including those of its groups."""
+        if isinstance(self, AuthAdmin):
+            result = EffectivePermissions()
+            result.add(MetaPermission.ADMIN, None)
+            return result
+
+        return AuthPermission.permission_table().resolve(
+            "group" if isinstance(self, AuthGroup) else "auth",
+            self.id,
+            list(getattr(self, "groups", [])),
+        )
+
+    @property
     def is_admin(self) -> bool:
-        return any([i.permission == MetaPermission.ADMIN for i in self.permissions()])
+        return self.effective_permissions().is_admin
 
-    @cached_property
+    @property
     def is_uploader(self) -> bool:
-        return any([i.permission == MetaPermission.CREATE for i in self.permissions()])
+        return self.effective_permissions().allows(MetaPermission.CREATE)
 
     def check_access(self, project: str) -> PackagePermission | None:
-        results = self.permissions(project=project)
-        if len(results) == 0:
-            return None
-
-        bare = [i.permissions for i in results]
-        if PackagePermission.MANAGE in bare:
-            return PackagePermission.MANAGE
-        elif PackagePermission.EDIT in bare:
-            return PackagePermission.EDIT
-        elif PackagePermission.VIEW in bare:
-            return PackagePermission.VIEW
-        return None
+        return self.effective_permissions().highest(project)
 
     def has_permission(
         self, permission: MetaPermission | PackagePermission, project: str | None = None
     ) -> bool:
-        perms = self.permissions()
-        metas = [i.permission for i in perms if i.permission in MetaPermission]
-        pkgs = [
-            i.permission
-            for i in perms
-            if i.permission in PackagePermission and i.project == project
-        ]
-        match permission:
-            case MetaPermission.ADMIN:
-                return MetaPermission.ADMIN in metas
-            case MetaPermission.CREATE:
-                return MetaPermission.CREATE in metas or MetaPermission.ADMIN
-            case PackagePermission.MANAGE:
-                return PackagePermission.MANAGE in pkgs or MetaPermission.ADMIN in metas
-            case PackagePermission.EDIT:
-                return (
-                    PackagePermission.EDIT in pkgs
-                    or PackagePermission.MANAGE in pkgs
-                    or MetaPermission.ADMIN in metas
-                )
-            case PackagePermission.VIEW:
-                return (
-                    PackagePermission.VIEW in pkgs
-                    or PackagePermission.EDIT in pkgs
-                    or PackagePermission.MANAGE in pkgs
-                    or MetaPermission.ADMIN in metas
-                )
+        return self.effective_permissions().allows(permission, project=project)
 
-        return False
+    def visible_projects(self) -> set[str] | Literal["all"]:
+        """Returns every project this principal holds pkg.view (or higher) on, or "all" for administrators."""
+        return self.effective_permissions().visible_projects()
 
 
 class AuthAdmin(_AuthAdmin, AuthBase):
@@ -102,14 +83,32 @@ class AuthAdmin(_AuthAdmin, AuthBase):
 
 class AuthUser(_AuthUser, BaseObject, AuthBase):
     _collection = "creds"
+    _indexes = ["username", "groups"]
+    _credentials: ClassVar[CredentialCache] = CredentialCache(ttl=0)
+
+    @classmethod
+    def set_credential_cache(cls, cache: CredentialCache) -> None:
+        cls._credentials = cache
 
     @staticmethod
     def make_password(password: str | None) -> tuple[str, str]:
         if password:
             password_salt = os.urandom(32).hex()
-            password_hash = pbkdf2_hmac(
-                "sha256", password.encode(), bytes.fromhex(password_salt), 100000
-            ).hex()
+            password_hash = hash_password(password, password_salt)
+        else:
+            password_salt = None
+            password_hash = None
+
+        return password_hash, password_salt
+
+    @staticmethod
+    async def make_password_async(
+        password: str | None, hasher: PasswordHasher
+    ) -> tuple[str, str]:
+        """Same as `make_password()`, but hashes in the worker pool."""
+        if password:
+            password_salt = os.urandom(32).hex()
+            password_hash = await hasher.run(hash_password, password, password_salt)
         else:
             password_salt = None
             password_hash = None
@@ -123,17 +122,75 @@ class AuthUser(_AuthUser, BaseObject, AuthBase):
             username=username, password_hash=password_hash, password_salt=password_salt
         )
 
-    def verify(self, password: str | None) -> bool:
+    @classmethod
+    async def create_async(
+        cls, username: str, hasher: PasswordHasher, password: str | None = None
+    ) -> "AuthUser":
+        """Same as `create()`, but hashes in the worker pool."""
+        password_hash, password_salt = await cls.make_password_async(password, hasher)
+        return AuthUser(
+            username=username, password_hash=password_hash, password_salt=password_salt
+        )
+
+    def _verify_cached(self, password: str | None) -> bool | None:
+        """Returns the verification result if it can be decided without hashing, otherwise None."""
         if password == None or password == "":
             return self.password_hash == None
 
-        return (
-            pbkdf2_hmac(
-                "sha256", password.encode(), bytes.fromhex(self.password_salt), 100000
-            ).hex()
-            == self.password_hash
+        if self.password_hash == None:
+            return False
+
+        if self._credentials.check(
+            self.username, password, self.password_salt, self.password_hash
+        ):
+            return True
+        return None
+
+    def _verify_result(self, password: str, password_hash: str) -> bool:
+        verified = password_hash == self.password_hash
+        if verified:
+            self._credentials.store(
+                self.id, self.username, password, self.password_salt, self.password_hash
+            )
+        return verified
+
+    def verify(self, password: str | None) -> bool:
+        result = self._verify_cached(password)
+        if result != None:
+            return result
+
+        return self._verify_result(
+            password, hash_password(password, self.password_salt)
+        )
+
+    async def verify_async(self, password: str | None, hasher: PasswordHasher) -> bool:
+        """Same as `verify()`, but hashes in the worker pool."""
+        result = self._verify_cached(password)
+        if result != None:
+            return result
+
+        return self._verify_result(
+            password, await hasher.run(hash_password, password, self.password_salt)
         )
 
+    def set_password(self, password: str | None) -> None:
+        """Replaces the stored password hash & drops cached verifications. Does not save."""
+        self.password_hash, self.password_salt = self.make_password(password)
+        self._credentials.invalidate(self.id)
+
+    async def set_password_async(
+        self, password: str | None, hasher: PasswordHasher
+    ) -> None:
+        """Same as `set_password()`, but hashes in the worker pool."""
+        self.password_hash, self.password_salt = await self.make_password_async(
+            password, hasher
+        )
+        self._credentials.invalidate(self.id)
+
+    def delete(self) -> None:
+        super().delete()
+        self._credentials.invalidate(self.id)
+
     @classmethod
     def from_username(cls, username: str) -> "AuthUser | None":
         return cls.find_one(where("username") == username)
@@ -141,6 +198,11 @@ class AuthUser(_AuthUser, BaseObject, AuthBase):
 
 class AuthGroup(_AuthGroup, BaseObject, AuthBase):
     _collection = "groups"
+    _indexes = ["name"]
+
+    def delete(self) -> None:
+        super().delete()
+        AuthPermission.permission_table().invalidate("group", self.id)
 
     def get_members(self) -> list["AuthUser | AuthToken"]:
         users = AuthUser.find(
@@ -154,6 +216,7 @@ class AuthGroup(_AuthGroup, BaseObject, AuthBase):
 
 class AuthToken(_AuthToken, BaseObject, AuthBase):
     _collection = "creds"
+    _indexes = ["token", "groups"]
 
     @classmethod
     def from_token(cls, token: str) -> "AuthToken | None":
@@ -162,6 +225,33 @@ class AuthToken(_AuthToken, BaseObject, AuthBase):
 
 class AuthPermission(_AuthPermission, BaseObject):
     _collection = "permissions"
+    _indexes = [("target_type", "target_id"), "project"]
+    _table: ClassVar[PermissionTable | None] = None
+
+    @classmethod
+    def permission_table(cls) -> PermissionTable:
+        """Returns the effective-permission table for the active database, creating it if required."""
+        if cls._table == None or cls._table.engine is not cls._db:
+            cls._table = PermissionTable(
+                cls._db,
+                lambda target_type, target_id: [
+                    (i.permission, i.project)
+                    for i in cls.find(
+                        (where("target_type") == target_type)
+                        & (where("target_id") == target_id)
+                    )
+                ],
+                lambda group_id: AuthGroup.get(group_id) != None,
+            )
+        return cls._table
+
+    def save(self) -> None:
+        super().save()
+        self.permission_table().invalidate(self.target_type, self.target_id)
+
+    def delete(self) -> None:
+        super().delete()
+        self.permission_table().invalidate(self.target_type, self.target_id)
 
     @classmethod
     def get_permissions(
@@ -204,58 +294,114 @@ class AuthPermission(_AuthPermission, BaseObject):
         return results
 
 
-def get_authentication(
-    request: Request, context: Any
+async def get_authentication(
+    request: ASGIConnection, context: Any
 ) -> AuthAdmin | AuthToken | AuthUser | None:
+    """Decodes & verifies the Basic authorization header of a connection.
+
+    Prefer `authenticate()`, which only does this once per request.
+
+    Args:
+        request (ASGIConnection): Current connection
+        context (Any): Application context
+
+    Returns:
+        AuthAdmin | AuthToken | AuthUser | None: Authenticated principal, or None if no credentials were sent
+    """
     auth = request.headers.get("authorization")
     if auth == None:
         return None
 
     mode, encoded = auth.split(" ", maxsplit=1)
     if mode.lower() != "basic":
-        raise ClientException(
-            f"Incompatible authentication type {mode}. Only Basic is supported to maximize PEP compliance."
+        raise NotAuthorizedException(
+            f"Incompatible authentication type {mode}. Only Basic is supported to maximize PEP compliance.",
+            headers={"WWW-Authenticate": "Basic"},
         )
 
     try:
         decoded = base64.b64decode(encoded).decode()
+        username, password = decoded.split(":", maxsplit=1)
     except:
         raise ClientException("Failure to decode authentication data")
 
-    username, password = decoded.split(":", maxsplit=1)
     if len(username) == 0:
-        raise ClientException("A username must be provided")
+        raise NotAuthorizedException(
+            "A username must be provided", headers={"WWW-Authenticate": "Basic"}
+        )
 
     if username == "_token_":
         if not password:
-            raise ClientException("An API token was not provided")
+            raise NotAuthorizedException(
+                "An API token was not provided",
+                headers={"WWW-Authenticate": "Basic"},
+            )
 
         result = AuthToken.from_token(password)
         if not result:
-            raise NotAuthorizedException("Invalid API token provided")
+            raise NotAuthorizedException(
+                "Invalid API token provided", headers={"WWW-Authenticate": "Basic"}
+            )
         return result
 
     else:
         if (
-            username == context.config.auth.admin.username
+            context.config.auth.admin
+            and username == context.config.auth.admin.username
             and context.config.auth.admin.enabled
         ):
             if password != context.config.auth.admin.password:
-                raise NotAuthorizedException("Invalid username or password")
+                raise NotAuthorizedException(
+                    "Invalid username or password",
+                    headers={"WWW-Authenticate": "Basic"},
+                )
             return AuthAdmin(username=context.config.auth.admin.username)
 
         result = AuthUser.from_username(username)
         if not result:
-            raise NotAuthorizedException("Invalid username or password")
+            raise NotAuthorizedException(
+                "Invalid username or password",
+                headers={"WWW-Authenticate": "Basic"},
+            )
 
-        if not result.verify(password):
-            raise NotAuthorizedException("Invalid username or password")
+        if not await result.verify_async(password, context.hasher):
+            raise NotAuthorizedException(
+                "Invalid username or password",
+                headers={"WWW-Authenticate": "Basic"},
+            )
         return result
 
 
+async def authenticate(
+    connection: ASGIConnection, context: Any
+) -> AuthAdmin | AuthToken | AuthUser | None:
+    """Resolves the authenticated principal once per request & stores it on the connection state.
+
+    Guards & dependencies should call this instead of `get_authentication()`, so that the header is
+    decoded & the password verified only once.
+
+    Args:
+        connection (ASGIConnection): Current connection
+        context (Any): Application context
+
+    Returns:
+        AuthAdmin | AuthToken | AuthUser | None: Authenticated principal, or None if anonymous
+    """
+    state = connection.scope.setdefault("state", {})
+    if "auth" in state:
+        record_event(connection, "auth-reused")
+        return state["auth"]
+
+    start = time.perf_counter()
+    result = await get_authentication(connection, context)
+    record_timing(connection, "auth", time.perf_counter() - start)
+    state["auth"] = result
+    return result
+
+
 async def guard_admin(connection: ASGIConnection, _: BaseRouteHandler) -> None:
-    auth = get_authentication(connection, connection.app.state.context)
-    if not auth.is_admin:
+    auth = await authenticate(connection, connection.app.state.context)
+    if not auth or not auth.is_admin:
         raise NotAuthorizedException(
             "Access to this endpoint is forbidden without the meta.admin permission."
         )
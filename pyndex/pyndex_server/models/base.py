@@ -1,20 +1,25 @@
 from typing import ClassVar, Type, TypeVar
 from uuid import uuid4
 from pydantic import BaseModel, Field
-from tinydb import Query, TinyDB, where
-from tinydb.table import Table
+from tinydb import Query
 import humps
+from .storage import StorageEngine
+from .index import CollectionIndex
+from .cache import ObjectCache
 
 TClass = TypeVar("TClass", bound="BaseObject")
 
 
 class BaseObject(BaseModel):
-    _db: ClassVar[TinyDB | None] = None
+    _db: ClassVar[StorageEngine | None] = None
     _collection: ClassVar[str | None] = None
+    _indexes: ClassVar[list[str | tuple[str, ...]]] = []
+    _index_store: ClassVar[dict[str, CollectionIndex]] = {}
+    _cache: ClassVar[ObjectCache] = ObjectCache(capacity=0)
     id: str = Field(default_factory=lambda: uuid4().hex)
 
     @property
-    def db(self) -> TinyDB:
+    def db(self) -> StorageEngine:
         if self._db == None:
             raise RuntimeError("Database was not initialized")
 
@@ -27,10 +32,6 @@ class BaseObject(BaseModel):
 
         return humps.camelize(self.__class__.__name__)
 
-    @property
-    def table(self) -> Table:
-        return self.db.table(self.collection)
-
     @classmethod
     def _collection_name(cls) -> str:
         if cls._collection:
@@ -39,38 +40,94 @@ class BaseObject(BaseModel):
         return humps.camelize(cls.__name__)
 
     @classmethod
-    def set_db(cls, db: TinyDB):
+    def set_db(cls, db: StorageEngine):
         cls._db = db
 
+    @classmethod
+    def _index(cls) -> CollectionIndex | None:
+        return BaseObject._index_store.get(cls._collection_name())
+
+    @classmethod
+    def _search(cls, query: Query) -> list[dict]:
+        index = cls._index()
+        if index:
+            result = index.search(query)
+            if result != None:
+                return result
+
+        return cls._db.search(cls._collection_name(), query)
+
+    @classmethod
+    def _from_document(cls: Type[TClass], document: dict) -> TClass:
+        cached = BaseObject._cache.get(cls._collection_name(), document["id"], cls)
+        if cached:
+            return cached
+
+        result = cls(**document)
+        BaseObject._cache.put(cls._collection_name(), result)
+        return result
+
     @classmethod
     def find(cls: Type[TClass], query: Query) -> list[TClass]:
-        return [cls(**i) for i in cls._db.table(cls._collection_name()).search(query)]
+        return [cls._from_document(i) for i in cls._search(query)]
 
     @classmethod
     def find_one(cls: Type[TClass], query: Query) -> TClass | None:
-        result = cls._db.table(cls._collection_name()).search(query)
-        return cls(**result[0]) if len(result) > 0 else None
+        result = cls._search(query)
+        return cls._from_document(result[0]) if len(result) > 0 else None
 
     @classmethod
     def get(cls: Type[TClass], id: str) -> TClass | None:
-        result = cls._db.table(cls._collection_name()).get(where("id") == id)
-        return cls(**result) if result else None
+        cached = BaseObject._cache.get(cls._collection_name(), id, cls)
+        if cached:
+            return cached
+
+        result = cls._db.get(cls._collection_name(), id)
+        if not result:
+            return None
+
+        created = cls(**result)
+        BaseObject._cache.put(cls._collection_name(), created)
+        return created
 
     @classmethod
     def exists(cls: Type[TClass], query: Query) -> bool:
-        return cls._db.table(cls._collection_name()).contains(query)
+        index = cls._index()
+        if index:
+            result = index.search(query)
+            if result != None:
+                return len(result) > 0
+
+        return cls._db.contains(cls._collection_name(), query)
 
     @classmethod
     def all(cls: Type[TClass]) -> list[TClass]:
-        return [cls(**i) for i in cls._db.table(cls._collection_name()).all()]
+        return [cls._from_document(i) for i in cls._db.all(cls._collection_name())]
 
     def save(self) -> None:
-        self.table.upsert(self.model_dump(mode="json"), cond=where("id") == self.id)
+        document = self.model_dump(mode="json")
+        self.db.upsert(self.collection, document)
+        index = self._index()
+        if index:
+            index.update(document)
+        BaseObject._cache.put(self.collection, self)
 
     def delete(self) -> None:
-        self.table.remove(cond=where("id") == self.id)
-
-
-def initialize(db: TinyDB, objs: list[Type[BaseObject]]):
+        self.db.remove(self.collection, self.id)
+        index = self._index()
+        if index:
+            index.discard(self.id)
+        BaseObject._cache.discard(self.collection, self.id)
+
+
+def initialize(
+    db: StorageEngine, objs: list[Type[BaseObject]], cache_size: int = 4096
+):
+    BaseObject._index_store.clear()
+    BaseObject._cache = ObjectCache(capacity=cache_size)
     for i in objs:
         i.set_db(db)
+        if len(i._indexes) > 0:
+            BaseObject._index_store.setdefault(
+                i._collection_name(), CollectionIndex(i._collection_name(), db)
+            ).declare(i._indexes)
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Any, Type
+from pydantic import BaseModel, computed_field
+
+
+class CacheStats(BaseModel):
+    size: int
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @computed_field
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class ObjectCache:
+    """Bounded LRU cache of validated models, keyed by `(collection, id)`.
+
+    The cache keeps its own deep copy of each model & hands out deep copies, so a request mutating a model
+    is never visible to other requests until it is saved (which replaces the entry). Copying skips
+    validation, which is what makes cached lookups cheaper than rebuilding models from documents.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, collection: str, id: str, cls: Type[Any]) -> Any | None:
+        """Returns a copy of the cached instance for `(collection, id)` if it is an instance of `cls`."""
+        with self.lock:
+            result = self.entries.get((collection, id))
+            if result != None and isinstance(result, cls):
+                self.entries.move_to_end((collection, id))
+                self.hits += 1
+                return result.model_copy(deep=True)
+
+            self.misses += 1
+            return None
+
+    def put(self, collection: str, obj: Any) -> None:
+        if self.capacity <= 0:
+            return
+
+        obj = obj.model_copy(deep=True)
+        with self.lock:
+            self.entries[(collection, obj.id)] = obj
+            self.entries.move_to_end((collection, obj.id))
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, collection: str, id: str) -> None:
+        with self.lock:
+            self.entries.pop((collection, id), None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(
+                size=len(self.entries),
+                capacity=self.capacity,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+
+
+class CredentialCache:
+    """Short-lived cache of successful password verifications.
+
+    Entries are keyed by an HMAC (with a random per-process key) over the username, the supplied password
+    and the stored salt & hash, so plaintext passwords are never held in memory and any password change
+    naturally misses. Entries can also be dropped explicitly per user.
+    """
+
+    def __init__(self, ttl: float = 60.0, capacity: int = 1024) -> None:
+        self.ttl = ttl
+        self.capacity = capacity
+        self.key = os.urandom(32)
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _digest(
+        self,
+        username: str | None,
+        password: str,
+        salt: str | None,
+        password_hash: str | None,
+    ) -> bytes:
+        message = "\0".join([username or "", password, salt or "", password_hash or ""])
+        return hmac.new(self.key, message.encode(), hashlib.sha256).digest()
+
+    def check(
+        self,
+        username: str | None,
+        password: str,
+        salt: str | None,
+        password_hash: str | None,
+    ) -> bool:
+        """Returns True if this exact credential was verified within the TTL."""
+        if self.ttl <= 0 or self.capacity <= 0:
+            return False
+
+        digest = self._digest(username, password, salt, password_hash)
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return True
+
+            if entry:
+                del self.entries[digest]
+            self.misses += 1
+            return False
+
+    def store(
+        self,
+        user_id: str,
+        username: str | None,
+        password: str,
+        salt: str | None,
+        password_hash: str | None,
+    ) -> None:
+        """Records a successful verification."""
+        if self.ttl <= 0 or self.capacity <= 0:
+            return
+
+        digest = self._digest(username, password, salt, password_hash)
+        with self.lock:
+            self.entries[digest] = (user_id, time.monotonic() + self.ttl)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """Drops every cached verification belonging to a user."""
+        with self.lock:
+            for digest in [k for k, v in self.entries.items() if v[0] == user_id]:
+                del self.entries[digest]
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(
+                size=len(self.entries),
+                capacity=self.capacity,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import pbkdf2_hmac
+import threading
+from typing import Any, Callable, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+PBKDF2_ITERATIONS = 100000
+
+
+def hash_password(password: str, salt: str) -> str:
+    """Derives the stored hash of a password with its hex-encoded salt."""
+    return pbkdf2_hmac(
+        "sha256", password.encode(), bytes.fromhex(salt), PBKDF2_ITERATIONS
+    ).hex()
+
+
+class HasherStats(BaseModel):
+    workers: int
+    queued: int
+    running: int
+    completed: int
+    max_queued: int
+
+
+class PasswordHasher:
+    """Bounded thread pool for password hashing.
+
+    PBKDF2 releases the GIL while it runs, so hashing in worker threads keeps the event loop free to
+    serve other requests. The executor is created lazily, so a closed hasher is reopened on next use.
+    """
+
+    def __init__(self, workers: int = 2) -> None:
+        self.workers = max(1, workers)
+        self.lock = threading.Lock()
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.max_queued = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.executor == None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="pyndex-hash"
+                )
+            return self.executor
+
+    def _wrap(self, func: Callable[..., T], *args: Any) -> T:
+        with self.lock:
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.pending -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Runs a hashing function in the pool & awaits its result."""
+        executor = self._executor()
+        with self.lock:
+            self.pending += 1
+            self.max_queued = max(self.max_queued, self.pending - self.running)
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, self._wrap, func, *args
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> HasherStats:
+        with self.lock:
+            return HasherStats(
+                workers=self.workers,
+                queued=self.pending - self.running,
+                running=self.running,
+                completed=self.completed,
+                max_queued=self.max_queued,
+            )
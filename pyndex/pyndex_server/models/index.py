@@ -0,0 +1,142 @@
+import threading
+from typing import Any, Hashable
+from tinydb import Query
+from .storage import StorageEngine
+
+
+class CollectionIndex:
+    """In-memory secondary hash indexes over a single collection.
+
+    Indexes are declared as field names or tuples of field names. Scalar fields are indexed by value,
+    and list-valued single-field indexes (ie `groups`) are indexed by each of their elements. The index
+    is loaded lazily from the storage engine on first use and is kept current by `update()`/`discard()`,
+    so it assumes that this process is the only writer to the underlying database.
+    """
+
+    def __init__(self, collection: str, engine: StorageEngine) -> None:
+        self.collection = collection
+        self.engine = engine
+        self.lock = threading.RLock()
+        self.fields: list[tuple[str, ...]] = []
+        self.documents: dict[str, dict] | None = None
+        self.indexes: dict[tuple[str, ...], dict[Hashable, set[str]]] = {}
+
+    def declare(self, fields: list[str | tuple[str, ...]]) -> None:
+        """Registers additional indexed fields. Existing indexes are rebuilt on next use."""
+        with self.lock:
+            for spec in fields:
+                key = (spec,) if isinstance(spec, str) else tuple(spec)
+                if not key in self.fields:
+                    self.fields.append(key)
+            self.documents = None
+            self.indexes = {}
+
+    def _keys(self, fields: tuple[str, ...], document: dict) -> list[Hashable]:
+        if len(fields) == 1:
+            value = document.get(fields[0])
+            if isinstance(value, list):
+                return [(i,) for i in value if isinstance(i, Hashable)]
+            return [(value,)] if isinstance(value, Hashable) else []
+
+        values = tuple(document.get(i) for i in fields)
+        return [values] if all([isinstance(i, Hashable) for i in values]) else []
+
+    def _add(self, document: dict) -> None:
+        self.documents[document["id"]] = document
+        for fields in self.fields:
+            for key in self._keys(fields, document):
+                self.indexes[fields].setdefault(key, set()).add(document["id"])
+
+    def _remove(self, id: str) -> None:
+        document = self.documents.pop(id, None)
+        if document == None:
+            return
+        for fields in self.fields:
+            for key in self._keys(fields, document):
+                ids = self.indexes[fields].get(key)
+                if ids != None:
+                    ids.discard(id)
+                    if len(ids) == 0:
+                        del self.indexes[fields][key]
+
+    def _ensure_loaded(self) -> None:
+        if self.documents != None:
+            return
+
+        self.documents = {}
+        self.indexes = {fields: {} for fields in self.fields}
+        for document in self.engine.all(self.collection):
+            self._add(document)
+
+    def update(self, document: dict) -> None:
+        """Replaces the indexed copy of a saved document."""
+        with self.lock:
+            if self.documents == None:
+                return
+            self._remove(document["id"])
+            self._add(document)
+
+    def discard(self, id: str) -> None:
+        """Removes a deleted document from all indexes."""
+        with self.lock:
+            if self.documents == None:
+                return
+            self._remove(id)
+
+    def _constraints(self, spec: Any) -> tuple[dict[str, Any], dict[str, tuple]]:
+        """Collects top-level equality & list-membership constraints from a query hash."""
+        equals: dict[str, Any] = {}
+        members: dict[str, tuple] = {}
+        if not isinstance(spec, tuple) or len(spec) == 0:
+            return equals, members
+
+        match spec[0]:
+            case "and":
+                for part in spec[1]:
+                    part_equals, part_members = self._constraints(part)
+                    equals.update(part_equals)
+                    members.update(part_members)
+            case "==":
+                if len(spec[1]) == 1 and isinstance(spec[2], Hashable):
+                    equals[spec[1][0]] = spec[2]
+            case "any":
+                if (
+                    len(spec[1]) == 1
+                    and isinstance(spec[2], tuple)
+                    and all([isinstance(i, Hashable) for i in spec[2]])
+                ):
+                    members[spec[1][0]] = spec[2]
+        return equals, members
+
+    def search(self, query: Query) -> list[dict] | None:
+        """Searches using a matching index.
+
+        Args:
+            query (Query): TinyDB query
+
+        Returns:
+            list[dict] | None: Matching documents, or None if no declared index applies to the query
+        """
+        if len(self.fields) == 0 or not query.is_cacheable():
+            return None
+
+        equals, members = self._constraints(query._hash)
+        candidates: list[tuple[tuple[str, ...], list[Hashable]]] = []
+        for fields in self.fields:
+            if all([i in equals for i in fields]):
+                candidates.append((fields, [tuple(equals[i] for i in fields)]))
+            elif len(fields) == 1 and fields[0] in members:
+                candidates.append((fields, [(i,) for i in members[fields[0]]]))
+
+        if len(candidates) == 0:
+            return None
+
+        fields, keys = max(candidates, key=lambda x: len(x[0]))
+        with self.lock:
+            self._ensure_loaded()
+            ids: set[str] = set()
+            for key in keys:
+                ids.update(self.indexes[fields].get(key, set()))
+            documents = [self.documents[i] for i in ids]
+
+        return [i for i in documents if query(i)]
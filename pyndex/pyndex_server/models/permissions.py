@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Literal
+from ...common import MetaPermission, PackagePermission
+
+PACKAGE_RANK = {
+    PackagePermission.VIEW: 1,
+    PackagePermission.EDIT: 2,
+    PackagePermission.MANAGE: 3,
+}
+
+
+class EffectivePermissions:
+    """Flattened permissions of a principal: a set of meta-permissions & the highest permission held per project."""
+
+    def __init__(self) -> None:
+        self.metas: set[MetaPermission] = set()
+        self.projects: dict[str, PackagePermission] = {}
+
+    def add(self, permission: str, project: str | None) -> None:
+        if permission in MetaPermission:
+            self.metas.add(MetaPermission(permission))
+        elif permission in PackagePermission and project:
+            permission = PackagePermission(permission)
+            current = self.projects.get(project)
+            if current == None or PACKAGE_RANK[permission] > PACKAGE_RANK[current]:
+                self.projects[project] = permission
+
+    def merge(self, other: "EffectivePermissions") -> None:
+        self.metas.update(other.metas)
+        for project, permission in other.projects.items():
+            self.add(permission, project)
+
+    @property
+    def is_admin(self) -> bool:
+        return MetaPermission.ADMIN in self.metas
+
+    def visible_projects(self) -> set[str] | Literal["all"]:
+        """Returns the projects this principal can view, or "all" for administrators."""
+        if self.is_admin:
+            return "all"
+        return set(self.projects.keys())
+
+    def highest(self, project: str) -> PackagePermission | None:
+        """Returns the highest package permission held on a project (not counting meta.admin)."""
+        return self.projects.get(project)
+
+    def allows(
+        self, permission: MetaPermission | PackagePermission, project: str | None = None
+    ) -> bool:
+        if self.is_admin:
+            return permission in MetaPermission or permission in PackagePermission
+
+        match permission:
+            case MetaPermission.ADMIN:
+                return False
+            case MetaPermission.CREATE:
+                return MetaPermission.CREATE in self.metas
+            case PackagePermission.MANAGE | PackagePermission.EDIT | PackagePermission.VIEW:
+                held = self.projects.get(project) if project else None
+                return held != None and PACKAGE_RANK[held] >= PACKAGE_RANK[permission]
+
+        return False
+
+
+class PermissionTable:
+    """Materialized effective permissions per principal.
+
+    Grants are cached per `(target_type, target_id)` and invalidated individually whenever a permission on
+    that target is saved or deleted, or the target group is deleted. Each principal's merged view records
+    the versions of the grant sets it was built from & its group list, and is only rebuilt when one of
+    those changes. Both caches are bounded to `max_entries` principals, evicting the least recently used.
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        load_grants: Callable[[str, str], list[tuple[str, str | None]]],
+        group_exists: Callable[[str], bool],
+        max_entries: int = 1024,
+    ) -> None:
+        self.engine = engine
+        self.max_entries = max_entries
+        self.load_grants = load_grants
+        self.group_exists = group_exists
+        self.lock = threading.RLock()
+        self.grants: OrderedDict[tuple[str, str], EffectivePermissions] = OrderedDict()
+        self.versions: dict[tuple[str, str], int] = {}
+        self.effective: OrderedDict[
+            tuple[str, str],
+            tuple[tuple[str, ...], dict[tuple[str, str], int], EffectivePermissions],
+        ] = OrderedDict()
+
+    def _store(self, cache: OrderedDict, key: tuple[str, str], value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def invalidate(self, target_type: str, target_id: str) -> None:
+        """Marks the grants of a single target as changed."""
+        with self.lock:
+            key = (target_type, target_id)
+            self.grants.pop(key, None)
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _grants(self, target_type: str, target_id: str) -> EffectivePermissions:
+        key = (target_type, target_id)
+        if key in self.grants:
+            self.grants.move_to_end(key)
+            return self.grants[key]
+
+        result = EffectivePermissions()
+        for permission, project in self.load_grants(target_type, target_id):
+            result.add(permission, project)
+        self._store(self.grants, key, result)
+        return result
+
+    def resolve(
+        self, target_type: str, target_id: str, groups: list[str]
+    ) -> EffectivePermissions:
+        """Returns the effective permissions of a principal & its groups.
+
+        Args:
+            target_type (str): "auth" or "group"
+            target_id (str): Principal ID
+            groups (list[str]): IDs of groups the principal belongs to
+
+        Returns:
+            EffectivePermissions: Merged permissions
+        """
+        with self.lock:
+            sources = [(target_type, target_id), *[("group", i) for i in groups]]
+            cached = self.effective.get((target_type, target_id))
+            if cached and cached[0] == tuple(groups):
+                if all([self.versions.get(i, 0) == cached[1].get(i) for i in sources]):
+                    self.effective.move_to_end((target_type, target_id))
+                    return cached[2]
+
+            result = EffectivePermissions()
+            result.merge(self._grants(target_type, target_id))
+            for group in groups:
+                if self.group_exists(group):
+                    result.merge(self._grants("group", group))
+
+            self._store(
+                self.effective,
+                (target_type, target_id),
+                (tuple(groups), {i: self.versions.get(i, 0) for i in sources}, result),
+            )
+            return result
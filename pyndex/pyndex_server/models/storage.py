@@ -0,0 +1,341 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Literal
+from tinydb import Query, TinyDB, where
+
+# Document fields that get a real, indexed column in SQL-backed engines
+INDEXED_FIELDS = (
+    "type",
+    "name",
+    "username",
+    "token",
+    "permission",
+    "target_type",
+    "target_id",
+    "project",
+)
+
+
+class StorageEngine:
+    """Abstract document store behind BaseObject. Documents are JSON-compatible dicts keyed by `id`."""
+
+    def search(self, collection: str, query: Query) -> list[dict]:
+        raise NotImplementedError
+
+    def get(self, collection: str, id: str) -> dict | None:
+        raise NotImplementedError
+
+    def contains(self, collection: str, query: Query) -> bool:
+        return len(self.search(collection, query)) > 0
+
+    def all(self, collection: str) -> list[dict]:
+        raise NotImplementedError
+
+    def upsert(self, collection: str, document: dict) -> None:
+        raise NotImplementedError
+
+    def remove(self, collection: str, id: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class TinyDBEngine(StorageEngine):
+    """Legacy engine storing every collection in a single TinyDB JSON file."""
+
+    def __init__(self, path: str) -> None:
+        self.db = TinyDB(path)
+
+    def search(self, collection: str, query: Query) -> list[dict]:
+        return [dict(i) for i in self.db.table(collection).search(query)]
+
+    def get(self, collection: str, id: str) -> dict | None:
+        result = self.db.table(collection).get(where("id") == id)
+        return dict(result) if result else None
+
+    def contains(self, collection: str, query: Query) -> bool:
+        return self.db.table(collection).contains(query)
+
+    def all(self, collection: str) -> list[dict]:
+        return [dict(i) for i in self.db.table(collection).all()]
+
+    def upsert(self, collection: str, document: dict) -> None:
+        self.db.table(collection).upsert(document, cond=where("id") == document["id"])
+
+    def remove(self, collection: str, id: str) -> None:
+        self.db.table(collection).remove(cond=where("id") == id)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class SQLiteEngine(StorageEngine):
+    """SQLite engine with one table per collection.
+
+    Each document is stored as JSON alongside indexed columns for `id` and every field in `INDEXED_FIELDS`.
+    List-valued `groups` fields are mirrored into a `_memberships` table. TinyDB queries are translated
+    into SQL where possible to narrow the candidate rows, and the original query is then applied to the
+    candidates so results always match TinyDB semantics.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS _memberships (collection TEXT NOT NULL, doc_id TEXT NOT NULL, group_id TEXT NOT NULL, PRIMARY KEY (collection, group_id, doc_id))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS _memberships_doc ON _memberships (collection, doc_id)"
+        )
+        self.tables: set[str] = set()
+
+    def _table(self, collection: str) -> str:
+        """Returns the quoted table name for a collection, creating the table if required."""
+        name = '"' + collection.replace('"', '""') + '"'
+        if collection in self.tables:
+            return name
+
+        with self.lock:
+            columns = ", ".join(f'"{field}" TEXT' for field in INDEXED_FIELDS)
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, {columns}, data TEXT NOT NULL)"
+            )
+            for field in INDEXED_FIELDS:
+                index = '"' + f"{collection}_{field}".replace('"', '""') + '"'
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index} ON {name} ("{field}")'
+                )
+            self.tables.add(collection)
+        return name
+
+    def _column_value(self, value: Any) -> tuple[bool, Any]:
+        """Converts a query operand to a column value, if it can be compared in SQL."""
+        if value == None:
+            return True, None
+        if isinstance(value, str):
+            return True, str(value)
+        return False, None
+
+    def _translate(self, collection: str, spec: Any) -> tuple[str, list[Any]] | None:
+        """Translates a TinyDB query hash into a SQL condition.
+
+        Args:
+            collection (str): Collection being queried
+            spec (Any): Query hash, as produced by `Query._hash`
+
+        Returns:
+            tuple[str, list[Any]] | None: SQL fragment & parameters, or None if the query can't be narrowed in SQL
+        """
+        if not isinstance(spec, tuple) or len(spec) == 0:
+            return None
+
+        match spec[0]:
+            case "and":
+                parts = [self._translate(collection, i) for i in spec[1]]
+                parts = [i for i in parts if i != None]
+                if len(parts) == 0:
+                    return None
+                return (
+                    " AND ".join(f"({i[0]})" for i in parts),
+                    [param for i in parts for param in i[1]],
+                )
+            case "or":
+                parts = [self._translate(collection, i) for i in spec[1]]
+                if any([i == None for i in parts]):
+                    return None
+                return (
+                    " OR ".join(f"({i[0]})" for i in parts),
+                    [param for i in parts for param in i[1]],
+                )
+            case "==":
+                path, value = spec[1], spec[2]
+                if len(path) != 1 or not (path[0] == "id" or path[0] in INDEXED_FIELDS):
+                    return None
+                valid, value = self._column_value(value)
+                if not valid:
+                    return None
+                if value == None:
+                    return f'"{path[0]}" IS NULL', []
+                return f'"{path[0]}" = ?', [value]
+            case "one_of":
+                path, values = spec[1], spec[2]
+                if len(path) != 1 or not (path[0] == "id" or path[0] in INDEXED_FIELDS):
+                    return None
+                if not all([isinstance(i, str) for i in values]):
+                    return None
+                if len(values) == 0:
+                    return "0", []
+                return (
+                    f'"{path[0]}" IN ({", ".join("?" for _ in values)})',
+                    [str(i) for i in values],
+                )
+            case "any" | "all":
+                path, values = spec[1], spec[2]
+                if (
+                    spec[0] != "any"
+                    or path != ("groups",)
+                    or not isinstance(values, tuple)
+                    or not all([isinstance(i, str) for i in values])
+                ):
+                    return None
+                if len(values) == 0:
+                    return "0", []
+                return (
+                    f"id IN (SELECT doc_id FROM _memberships WHERE collection = ? AND group_id IN ({', '.join('?' for _ in values)}))",
+                    [collection, *[str(i) for i in values]],
+                )
+        return None
+
+    def search(self, collection: str, query: Query) -> list[dict]:
+        table = self._table(collection)
+        translated = (
+            self._translate(collection, query._hash) if query.is_cacheable() else None
+        )
+        with self.lock:
+            if translated:
+                rows = self.connection.execute(
+                    f"SELECT data FROM {table} WHERE {translated[0]}", translated[1]
+                ).fetchall()
+            else:
+                rows = self.connection.execute(f"SELECT data FROM {table}").fetchall()
+
+        documents = [json.loads(row[0]) for row in rows]
+        return [i for i in documents if query(i)]
+
+    def get(self, collection: str, id: str) -> dict | None:
+        table = self._table(collection)
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT data FROM {table} WHERE id = ?", [id]
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self, collection: str) -> list[dict]:
+        table = self._table(collection)
+        with self.lock:
+            rows = self.connection.execute(f"SELECT data FROM {table}").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _write(self, collection: str, document: dict) -> None:
+        table = self._table(collection)
+        values = [document["id"]]
+        for field in INDEXED_FIELDS:
+            valid, value = self._column_value(document.get(field))
+            values.append(value if valid else None)
+        values.append(json.dumps(document))
+
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' for _ in values)})",
+            values,
+        )
+        self.connection.execute(
+            "DELETE FROM _memberships WHERE collection = ? AND doc_id = ?",
+            [collection, document["id"]],
+        )
+        groups = document.get("groups")
+        if isinstance(groups, list):
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO _memberships VALUES (?, ?, ?)",
+                [
+                    (collection, document["id"], group)
+                    for group in groups
+                    if isinstance(group, str)
+                ],
+            )
+
+    def upsert(self, collection: str, document: dict) -> None:
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self._write(collection, document)
+                self.connection.execute("COMMIT")
+            except:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def upsert_many(self, collection: str, documents: list[dict]) -> None:
+        """Writes many documents in a single transaction."""
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                for document in documents:
+                    self._write(collection, document)
+                self.connection.execute("COMMIT")
+            except:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def remove(self, collection: str, id: str) -> None:
+        table = self._table(collection)
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.execute(f"DELETE FROM {table} WHERE id = ?", [id])
+                self.connection.execute(
+                    "DELETE FROM _memberships WHERE collection = ? AND doc_id = ?",
+                    [collection, id],
+                )
+                self.connection.execute("COMMIT")
+            except:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def migrate_tinydb(source: str, target: SQLiteEngine) -> int:
+    """Copies every collection of a TinyDB JSON file into a SQLite engine.
+
+    Args:
+        source (str): Path to the TinyDB JSON file
+        target (SQLiteEngine): Engine to copy documents into
+
+    Returns:
+        int: Number of documents migrated
+    """
+    with open(source, "r") as f:
+        contents = f.read().strip()
+
+    if len(contents) == 0:
+        return 0
+
+    count = 0
+    for collection, documents in json.loads(contents).items():
+        docs = [i for i in documents.values() if "id" in i]
+        target.upsert_many(collection, docs)
+        count += len(docs)
+    return count
+
+
+def open_engine(root: str, engine: Literal["sqlite", "tinydb"]) -> StorageEngine:
+    """Opens the configured storage engine within the storage root.
+
+    When opening a fresh SQLite database next to an existing `pyndex.json`, the TinyDB contents are
+    migrated once and the JSON file is renamed to `pyndex.json.migrated`.
+
+    Args:
+        root (str): Storage root
+        engine (Literal["sqlite", "tinydb"]): Engine type
+
+    Returns:
+        StorageEngine: Opened engine
+    """
+    legacy = os.path.join(root, "pyndex.json")
+    if engine == "tinydb":
+        return TinyDBEngine(legacy)
+
+    opened = SQLiteEngine(os.path.join(root, "pyndex.db"))
+    if os.path.exists(legacy):
+        migrate_tinydb(legacy, opened)
+        os.replace(legacy, legacy + ".migrated")
+    return opened
@@ -0,0 +1,135 @@
+import asyncio
+from collections import OrderedDict
+import re
+import time
+from typing import Any
+from packaging.utils import canonicalize_name
+from pydantic import BaseModel
+from .config import ProxyPrefetchConfig
+from .timing import record_event
+from .upstream import UpstreamClients
+
+REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)")
+
+
+def required_projects(requires_dist: list[str] | None) -> list[str]:
+    """Extracts the names of unconditional (non-extra) dependencies from `Requires-Dist` entries
+
+    Args:
+        requires_dist (list[str] | None): PEP 508 requirement strings
+
+    Returns:
+        list[str]: Normalized project names, in order of first appearance
+    """
+    names: list[str] = []
+    for requirement in requires_dist or []:
+        _, _, marker = requirement.partition(";")
+        if re.search(r"\bextra\b", marker):
+            continue
+        match = REQUIREMENT_NAME.match(requirement)
+        if match:
+            name = canonicalize_name(match.group(1))
+            if not name in names:
+                names.append(name)
+    return names
+
+
+class PrefetchStats(BaseModel):
+    scheduled: int
+    completed: int
+    failed: int
+    dropped: int
+    in_flight: int
+
+
+class Prefetcher:
+    """Warms the proxy cache for the dependency closure of proxied projects in the background.
+
+    Each scheduled project has its JSON-API & simple-API documents looked up (and thereby cached), then
+    the unconditional dependencies listed in its `requires_dist` are scheduled one level deeper, up to
+    `max_depth`. The simple-API document of the requested project itself (depth 0) is not refetched.
+    At most `concurrency` projects are fetched at once & at most `max_pending` wait; further projects are
+    dropped. Projects prefetched within the last `ttl` seconds are skipped.
+
+    Prefetch lookups are background traffic: they skip proxies whose breaker is open or probing, but
+    their outcomes aren't recorded in upstream health, so warming can't open breakers by itself.
+    """
+
+    def __init__(self, upstream: UpstreamClients, config: ProxyPrefetchConfig) -> None:
+        self.upstream = upstream
+        self.config = config
+        self.semaphore = asyncio.Semaphore(max(1, config.concurrency))
+        self.tasks: set[asyncio.Task] = set()
+        self.seen: OrderedDict[str, float] = OrderedDict()
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _recent(self, project_name: str) -> bool:
+        seen = self.seen.get(project_name)
+        return seen != None and time.monotonic() - seen < self.config.ttl
+
+    def schedule(self, project_name: str, depth: int = 0) -> None:
+        """Starts prefetching a project & its dependencies in the background
+
+        Args:
+            project_name (str): Project name
+            depth (int, optional): Distance from the project a client requested. Defaults to 0.
+        """
+        project_name = canonicalize_name(project_name)
+        if depth > self.config.max_depth or self.upstream.offline:
+            return
+        if self._recent(project_name):
+            return
+        if len(self.tasks) >= self.config.max_pending:
+            self.dropped += 1
+            record_event(None, "prefetch-dropped")
+            return
+
+        self.seen[project_name] = time.monotonic()
+        self.seen.move_to_end(project_name)
+        while len(self.seen) > self.config.max_entries:
+            self.seen.popitem(last=False)
+
+        self.scheduled += 1
+        task = asyncio.create_task(self._prefetch(project_name, depth))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _prefetch(self, project_name: str, depth: int) -> None:
+        try:
+            async with self.semaphore:
+                found = await self.upstream.lookup(
+                    "package", project_name, background=True
+                )
+                if depth > 0:
+                    await self.upstream.lookup(
+                        "simple", project_name, background=True
+                    )
+        except Exception:
+            self.failed += 1
+            record_event(None, "prefetch-failed")
+            return
+
+        self.completed += 1
+        if found == None or depth >= self.config.max_depth:
+            return
+        data: dict[str, Any] = found[1]
+        for name in required_projects((data.get("info") or {}).get("requires_dist")):
+            self.schedule(name, depth + 1)
+
+    async def close(self) -> None:
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> PrefetchStats:
+        return PrefetchStats(
+            scheduled=self.scheduled,
+            completed=self.completed,
+            failed=self.failed,
+            dropped=self.dropped,
+            in_flight=len(self.tasks),
+        )
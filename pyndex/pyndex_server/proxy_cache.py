@@ -0,0 +1,323 @@
+import asyncio
+from collections import OrderedDict
+import hashlib
+import os
+import time
+from typing import Awaitable, Callable
+import anyio
+from httpx import Response
+from packaging.utils import canonicalize_name
+from pydantic import BaseModel
+from .models import CacheStats
+from .timing import record_event
+from ..common.models.file_meta import write_atomic
+
+# Response headers kept with cached entries
+STORED_HEADERS = ["content-type", "etag", "last-modified"]
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ProxyCacheEntry(BaseModel):
+    key: str
+    proxy: str
+    url: str
+    status_code: int
+    headers: dict[str, str] = {}
+    fetched: float
+    size: int
+
+    def response(self, content: bytes) -> Response:
+        return Response(self.status_code, headers=self.headers, content=content)
+
+
+class ProxyCache:
+    """On-disk cache of upstream proxy responses, keyed by `(proxy, URL, Accept)`.
+
+    Each entry is a `<key>.json` record & a `<key>.body` file under `root`. Entries younger than `ttl` are
+    served directly. Older entries are served stale for up to `stale_ttl` more seconds while a background
+    task revalidates them with `If-None-Match`/`If-Modified-Since`; past that, they are revalidated before
+    being served. The total body size is capped at `max_size` bytes by evicting the least recently used
+    entries.
+    """
+
+    def __init__(
+        self, root: str, ttl: float, stale_ttl: float, max_size: int
+    ) -> None:
+        self.root = root
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[str, ProxyCacheEntry] = OrderedDict()
+        self.size = 0
+        self.refreshing: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Indexes existing entries, least recently fetched first"""
+        records: list[ProxyCacheEntry] = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                entry = ProxyCacheEntry.model_validate_json(read_file(path))
+                if os.path.exists(self._body_path(entry.key)):
+                    records.append(entry)
+                    continue
+            except ValueError:
+                pass
+            os.remove(path)
+
+        for entry in sorted(records, key=lambda x: x.fetched):
+            self.entries[entry.key] = entry
+            self.size += entry.size
+        self._evict()
+
+    @staticmethod
+    def make_key(proxy: str, url: str, accept: str | None) -> str:
+        return hashlib.sha256(f"{proxy}\x1f{url}\x1f{accept or ''}".encode()).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".body")
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".json")
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
+        for path in [self._record_path(key), self._body_path(key)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        while self.size > self.max_size and len(self.entries) > 0:
+            self._remove(next(iter(self.entries.keys())))
+            self.evictions += 1
+
+    async def _read(self, entry: ProxyCacheEntry) -> Response | None:
+        try:
+            content = await anyio.to_thread.run_sync(
+                read_file, self._body_path(entry.key)
+            )
+        except FileNotFoundError:
+            self._remove(entry.key)
+            return None
+        self.entries.move_to_end(entry.key)
+        return entry.response(content)
+
+    async def _store(
+        self, key: str, proxy: str, url: str, response: Response
+    ) -> ProxyCacheEntry:
+        entry = ProxyCacheEntry(
+            key=key,
+            proxy=proxy,
+            url=url,
+            status_code=response.status_code,
+            headers={
+                name: response.headers[name]
+                for name in STORED_HEADERS
+                if name in response.headers
+            },
+            fetched=time.time(),
+            size=len(response.content),
+        )
+
+        def write() -> None:
+            write_atomic(self._body_path(key), response.content)
+            write_atomic(self._record_path(key), entry.model_dump_json())
+
+        writing = asyncio.ensure_future(anyio.to_thread.run_sync(write))
+        try:
+            await asyncio.shield(writing)
+        except BaseException:
+            # A cancelled wait leaves the worker thread running, so its files are removed once it finishes
+            writing.add_done_callback(lambda _: self._remove(key))
+            raise
+        if key in self.entries:
+            self.size -= self.entries[key].size
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.size += entry.size
+        self._evict()
+        return entry
+
+    async def _revalidate(
+        self,
+        key: str,
+        proxy: str,
+        url: str,
+        fetch: Callable[[dict[str, str]], Awaitable[Response]],
+    ) -> Response:
+        """Fetches a URL, conditionally if an entry is cached, & updates the cache with the result"""
+        entry = self.entries.get(key)
+        conditions = {}
+        if entry:
+            if "etag" in entry.headers:
+                conditions["If-None-Match"] = entry.headers["etag"]
+            if "last-modified" in entry.headers:
+                conditions["If-Modified-Since"] = entry.headers["last-modified"]
+
+        response = await fetch(conditions)
+        if response.status_code == 304 and entry:
+            entry.fetched = time.time()
+            await anyio.to_thread.run_sync(
+                write_atomic, self._record_path(key), entry.model_dump_json()
+            )
+            record_event(None, "proxy-cache-revalidated")
+            cached = await self._read(entry)
+            if cached:
+                return cached
+            response = await fetch({})
+
+        if response.is_success:
+            await self._store(key, proxy, url, response)
+        return response
+
+    def _refresh_in_background(
+        self,
+        key: str,
+        proxy: str,
+        url: str,
+        fetch: Callable[[dict[str, str]], Awaitable[Response]],
+    ) -> None:
+        if key in self.refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                await self._revalidate(key, proxy, url, fetch)
+            except Exception:
+                record_event(None, "proxy-cache-refresh-failed")
+            finally:
+                self.refreshing.pop(key, None)
+
+        self.refreshing[key] = asyncio.create_task(refresh())
+
+    async def get(
+        self,
+        proxy: str,
+        url: str,
+        accept: str | None,
+        fetch: Callable[[dict[str, str]], Awaitable[Response]],
+    ) -> Response:
+        """Returns a cached upstream response, fetching or revalidating it as needed
+
+        Args:
+            proxy (str): Proxy name
+            url (str): Requested URL
+            accept (str | None): `Accept` header sent upstream
+            fetch (Callable[[dict[str, str]], Awaitable[Response]]): Performs the upstream request with the given extra (conditional) headers
+
+        Returns:
+            Response: Cached or fresh upstream response
+        """
+        key = self.make_key(proxy, url, accept)
+        entry = self.entries.get(key)
+        if entry:
+            age = time.time() - entry.fetched
+            if age < self.ttl + self.stale_ttl:
+                cached = await self._read(entry)
+                if cached:
+                    self.hits += 1
+                    if age >= self.ttl:
+                        record_event(None, "proxy-cache-stale")
+                        self._refresh_in_background(key, proxy, url, fetch)
+                    return cached
+
+        self.misses += 1
+        return await self._revalidate(key, proxy, url, fetch)
+
+    async def peek(self, proxy: str, url: str, accept: str | None) -> Response | None:
+        """Returns a cached upstream response regardless of its age, without contacting the upstream
+
+        Args:
+            proxy (str): Proxy name
+            url (str): Requested URL
+            accept (str | None): `Accept` header sent upstream
+
+        Returns:
+            Response | None: Cached response, or None if nothing is cached
+        """
+        entry = self.entries.get(self.make_key(proxy, url, accept))
+        cached = await self._read(entry) if entry else None
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return cached
+
+    async def close(self) -> None:
+        tasks = list(self.refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=self.size,
+            capacity=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+class NegativeCache:
+    """Bounded in-memory record of projects that a proxy recently reported as missing, keyed by
+    `(proxy, endpoint, normalized project name)` & expiring after `ttl` seconds.
+
+    The endpoint is part of the key since many mirrors serve the simple API but not the JSON API."""
+
+    def __init__(self, ttl: float, capacity: int) -> None:
+        self.ttl = ttl
+        self.capacity = capacity
+        self.entries: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, proxy: str, endpoint: str, project_name: str) -> bool:
+        """Checks whether a proxy's endpoint is known not to have a project"""
+        key = (proxy, endpoint, canonicalize_name(project_name))
+        expires = self.entries.get(key)
+        if expires != None:
+            if expires > time.monotonic():
+                self.hits += 1
+                return True
+            del self.entries[key]
+
+        self.misses += 1
+        return False
+
+    def add(self, proxy: str, endpoint: str, project_name: str) -> None:
+        if self.capacity <= 0 or self.ttl <= 0:
+            return
+
+        key = (proxy, endpoint, canonicalize_name(project_name))
+        self.entries[key] = time.monotonic() + self.ttl
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=len(self.entries),
+            capacity=self.capacity,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
@@ -1,13 +1,13 @@
-import base64
-from httpx import Request
-from litestar import Router
+from litestar import Request, Router
 from litestar.di import Provide
 from .files import FilesController
+from .mirror import MirrorController
 from .packages import PackageController
 from .user import UserController, RedactedAuth, UserQueryController, UserSelfController
 from .group import GroupController, SpecificGroupController
+from .server import ServerController
 from ..context import Context
-from ..models import AuthUser, AuthToken, AuthAdmin, get_authentication
+from ..models import AuthUser, AuthToken, AuthAdmin, authenticate
 from litestar.connection import ASGIConnection
 from litestar.exceptions import *
 from litestar.handlers.base import BaseRouteHandler
@@ -27,61 +27,7 @@ async def guard_authenticated(connection: ASGIConnection, _: BaseRouteHandler) -
                 headers={"WWW-Authenticate": "Basic"},
             )
 
-        mode, encoded = connection.headers["authorization"].split(" ", maxsplit=1)
-        if mode.lower() != "basic":
-            raise NotAuthorizedException(
-                f"Incompatible authentication type {mode}. Only Basic is supported to maximize PEP compliance.",
-                headers={"WWW-Authenticate": "Basic"},
-            )
-
-        try:
-            decoded = base64.b64decode(encoded).decode()
-        except:
-            raise ClientException("Failure to decode authentication data")
-
-        username, password = decoded.split(":", maxsplit=1)
-        if len(username) == 0:
-            raise NotAuthorizedException(
-                "A username must be provided", headers={"WWW-Authenticate": "Basic"}
-            )
-
-        if username == "_token_":
-            if not password:
-                raise NotAuthorizedException(
-                    "An API token was not provided",
-                    headers={"WWW-Authenticate": "Basic"},
-                )
-
-            result = AuthToken.from_token(password)
-            if not result:
-                raise NotAuthorizedException(
-                    "Invalid API token provided", headers={"WWW-Authenticate": "Basic"}
-                )
-
-        else:
-            if (
-                username == context.config.auth.admin.username
-                and context.config.auth.admin.enabled
-            ):
-                if password != context.config.auth.admin.password:
-                    raise NotAuthorizedException(
-                        "Invalid username or password",
-                        headers={"WWW-Authenticate": "Basic"},
-                    )
-                return
-
-            result = AuthUser.from_username(username)
-            if not result:
-                raise NotAuthorizedException(
-                    "Invalid username or password",
-                    headers={"WWW-Authenticate": "Basic"},
-                )
-
-            if not result.verify(password):
-                raise NotAuthorizedException(
-                    "Invalid username or password",
-                    headers={"WWW-Authenticate": "Basic"},
-                )
+        await authenticate(connection, context)
 
 
 async def provide_authentication(
@@ -96,7 +42,7 @@ async def provide_authentication(
     Returns:
         AuthUser | AuthToken | AuthAdmin | None: Active authenticated user/token
     """
-    return get_authentication(request, context)
+    return await authenticate(request, context)
 
 
 def make_api_router(base: str) -> Router:
@@ -112,12 +58,14 @@ def make_api_router(base: str) -> Router:
         base,
         route_handlers=[
             FilesController,
+            MirrorController,
             PackageController,
             UserController,
             UserSelfController,
             UserQueryController,
             GroupController,
             SpecificGroupController,
+            ServerController,
         ],
         guards=[guard_authenticated],
         dependencies={"auth": Provide(provide_authentication)},
@@ -1,8 +1,9 @@
 import json
 import os
-from litestar import Controller, get, Response
+import anyio
+from litestar import Controller, Request, get, Response
+from ..artifacts import Artifact, artifact_etag, requested_range
 from ..context import Context
-from litestar.response import File
 from litestar.exceptions import *
 from ..models import FileMetadata
 
@@ -15,48 +16,72 @@ class FilesController(Controller):
 
     @get("{project_name:str}/{project_version:str}/{filename:str}")
     async def get_project_file(
-        self, context: Context, project_name: str, project_version: str, filename: str
-    ) -> File:
+        self,
+        context: Context,
+        request: Request,
+        project_name: str,
+        project_version: str,
+        filename: str,
+    ) -> Response:
         """Gets a file associated with a specific project version.
 
         Args:
             context (Context): Application context
+            request (Request): HTTP request object, used for `Range` & `If-Range`
             project_name (str): Project name
             project_version (str): Project version
             filename (str): Filename, optionally with ".metadata" to request that file's metadata
 
         Returns:
-            File: Returns the file contents (or text metadata if requested)
+            Response: Returns the file contents (or text metadata if requested)
         """
 
         if filename.endswith(".metadata"):
-            if not context.root.joinpath(
-                "index",
-                project_name,
-                project_version,
-                filename.rsplit(".", maxsplit=1)[0] + ".json",
-            ).exists():
+            path = str(
+                context.root.joinpath("index", project_name, project_version, filename)
+            )
+            try:
+                with open(path.removesuffix(".metadata") + ".json", "r") as metafile:
+                    data = json.load(metafile)
+            except FileNotFoundError:
                 raise NotFoundException("Requested file does not exist.")
-            with open(
-                context.root.joinpath(
-                    "index",
-                    project_name,
-                    project_version,
-                    filename.rsplit(".", maxsplit=1)[0] + ".json",
-                ),
-                "r",
-            ) as metafile:
-                meta = FileMetadata(**json.load(metafile))
-
-            return Response(
-                meta.as_metadata(), status_code=200, media_type="text/plain"
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Files uploaded before core metadata was extracted at upload time
+                meta = FileMetadata(**data)
+                await anyio.to_thread.run_sync(
+                    meta.backfill_core_metadata, str(context.root.joinpath("index"))
+                )
+                data["core_metadata_sha256"] = meta.core_metadata_sha256
+                stat = os.stat(path)
+
+            etag = artifact_etag(data.get("core_metadata_sha256"), stat)
+            return Artifact(
+                path,
+                stat.st_size,
+                None,
+                etag,
+                byte_range=requested_range(request, stat.st_size, etag),
+                media_type="text/plain",
             )
         else:
-            if not context.root.joinpath(
-                "index", project_name, project_version, filename
-            ).exists():
+            path = str(
+                context.root.joinpath("index", project_name, project_version, filename)
+            )
+            try:
+                stat = os.stat(path)
+                with open(path + ".json", "r") as metafile:
+                    sha256 = json.load(metafile).get("sha256_digest")
+            except FileNotFoundError:
                 raise NotFoundException("Requested file does not exist.")
-            return File(
-                context.root.joinpath("index", project_name, project_version, filename),
-                filename=filename,
+
+            etag = artifact_etag(sha256, stat)
+            return Artifact(
+                path,
+                stat.st_size,
+                filename,
+                etag,
+                byte_range=requested_range(request, stat.st_size, etag),
             )
@@ -0,0 +1,96 @@
+import os
+from litestar import Controller, Request, Response, get
+from litestar.exceptions import *
+from litestar.response import Stream
+from ..artifact_cache import SHA256_PATTERN
+from ..artifacts import Artifact, artifact_etag, requested_range
+from ..context import Context
+from ..timing import record_event
+from ..upstream import STALE_HEADERS
+
+
+class MirrorController(Controller):
+    """
+    Serves proxied files through the pull-through artifact cache
+    """
+
+    path = "/mirror"
+
+    @get("/{sha256:str}/{filename:str}")
+    async def get_mirrored_file(
+        self, context: Context, request: Request, sha256: str, filename: str
+    ) -> Response:
+        """Gets a proxied file, downloading it into the artifact cache on first use.
+
+        Args:
+            context (Context): Application context
+            request (Request): HTTP request object, used for `Range` & `If-Range`
+            sha256 (str): sha256 digest of the file
+            filename (str): Filename
+
+        Raises:
+            NotFoundException: Raised if pull-through caching is disabled, or the file is neither cached nor listed by a proxy
+            ServiceUnavailableException: Raised if the file isn't cached while in offline mode
+
+        Returns:
+            Response: File contents, from the cache or streamed from upstream
+        """
+        if not context.artifacts:
+            raise NotFoundException("Pull-through caching is disabled.")
+        sha256 = sha256.lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise NotFoundException("Requested file does not exist.")
+
+        path = context.artifacts.path(sha256)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat:
+            record_event(request, "mirror-hit")
+            etag = artifact_etag(sha256, stat)
+            return Artifact(
+                path,
+                stat.st_size,
+                filename,
+                etag,
+                byte_range=requested_range(request, stat.st_size, etag),
+                headers=STALE_HEADERS if context.upstream.offline else None,
+            )
+
+        source = context.artifacts.source(sha256)
+        proxy = (
+            [i for i in context.config.proxies if i.name == source[0]]
+            if source
+            else []
+        )
+        if len(proxy) == 0:
+            raise NotFoundException("Requested file does not exist.")
+        if context.upstream.offline:
+            raise ServiceUnavailableException(
+                "Requested file is not cached & upstreams are unavailable."
+            )
+
+        record_event(request, "mirror-miss")
+        upstream = await context.artifacts.open_upstream(
+            context.upstream.client(proxy[0]), source[1]
+        )
+        if not upstream.is_success:
+            await upstream.aclose()
+            raise NotFoundException("Requested file is unavailable upstream.")
+
+        headers = {
+            "content-disposition": f'attachment; filename="{filename}"',
+            "etag": f'"{sha256}"',
+        }
+        # The body is streamed decoded, so the upstream length only applies without a content-coding. On a
+        # digest mismatch `tee()` withholds the final chunk, so the client sees a body shorter than this.
+        if "content-length" in upstream.headers and upstream.headers.get(
+            "content-encoding", "identity"
+        ) in ("", "identity"):
+            headers["content-length"] = upstream.headers["content-length"]
+        return Stream(
+            context.artifacts.tee(sha256, upstream),
+            headers=headers,
+            media_type="application/octet-stream",
+        )
@@ -1,14 +1,17 @@
-from litestar import Controller, post, get, Request
+from litestar import Controller, post, get, Request, Response
 import os
+import anyio
 from typing import Annotated, Any, Optional
-from httpx import AsyncClient
 
 from ..models import (
     FileMetadata,
+    DigestMismatchError,
+    UploadTooLargeError,
     Package,
     PackageList,
     PackageListItem,
     PackageDetail,
+    ProjectManifest,
     APIMeta,
     AuthUser,
     AuthAdmin,
@@ -16,10 +19,94 @@ from ..models import (
     MetaPermission,
     AuthPermission,
 )
+from ..conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified,
+    principal_key,
+    validator_headers,
+)
 from ..context import Context
+from ..documents import document_key, serve_document
+from ..upstream import STALE_HEADERS
 from litestar.enums import RequestEncodingType
 from litestar.params import Body
 from litestar.exceptions import *
+from litestar.status_codes import HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def project_validators(
+    context: Context, project_name: str, auth: Any, *parts: Any
+) -> tuple[str, str, float] | None:
+    """Returns the revision, ETag & modification time of a local project's responses, or None if it isn't local.
+
+    The revision identifies the current manifest (its change serial & modification time). The ETag also
+    covers the requesting principal & any endpoint-specific parts.
+    """
+    validator = ProjectManifest.validator(context.root.joinpath("index", project_name))
+    if validator == None:
+        return None
+    serial, modified = validator
+    revision = f"{serial}.{int(modified * 1000000)}"
+    return (
+        revision,
+        make_etag(project_name, revision, principal_key(auth), *parts),
+        modified,
+    )
+
+
+async def merged_file_info(
+    context: Context,
+    request: Request,
+    project_name: str,
+    base_url: str,
+    etag: str,
+) -> Response[PackageDetail]:
+    """Lists a local project's files together with those of its upstream counterpart
+
+    The local part is rendered from the project manifest & the upstream part is read through the proxy
+    cache (which `Config` requires for merging), so neither is refetched unless it changed or went stale.
+    Local files win on filename collisions.
+
+    Args:
+        context (Context): Application context
+        request (Request): HTTP request object
+        project_name (str): Project name
+        base_url (str): Base URL of file links
+        etag (str): ETag of the local part
+
+    Returns:
+        Response[PackageDetail]: Merged project detail, or 304 if the client's copy is current
+    """
+    project_path = str(context.root.joinpath("index", project_name))
+    detail = await anyio.to_thread.run_sync(
+        lambda: PackageDetail.from_manifest(
+            ProjectManifest.open(project_path), url_base=base_url
+        )
+    )
+
+    offline = context.upstream.offline
+    found = await context.upstream.lookup("simple", project_name, offline=offline)
+    if found:
+        proxy, data = found
+        upstream = PackageDetail(**data)
+        if context.artifacts:
+            context.artifacts.rewrite_detail(upstream, proxy.name, base_url)
+        detail = detail.merge(upstream)
+
+    merged_etag = make_etag(
+        etag, *[f"{file.filename}:{file.hashes.sha256}" for file in detail.files]
+    )
+    if is_not_modified(request, merged_etag):
+        return not_modified(merged_etag)
+    return Response(
+        detail,
+        headers={
+            **validator_headers(merged_etag),
+            **(STALE_HEADERS if offline and found else {}),
+        },
+        media_type="application/vnd.pypi.simple.v1+json",
+    )
 
 
 class PackageController(Controller):
@@ -62,11 +149,20 @@ class PackageController(Controller):
             new_package = True
 
         try:
-            await data.save(str(context.root.joinpath("index")))
+            await data.save(
+                str(context.root.joinpath("index")),
+                max_size=context.config.storage.max_upload_size,
+            )
         except FileExistsError:
             raise MethodNotAllowedException(
                 detail="Cannot overwrite an existing version of a package."
             )
+        except DigestMismatchError as e:
+            raise ClientException(detail=str(e))
+        except UploadTooLargeError as e:
+            raise HTTPException(
+                status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+            )
 
         if not isinstance(auth, AuthAdmin) and new_package:
             AuthPermission(
@@ -89,9 +185,12 @@ class PackageController(Controller):
         request: Request,
         auth: AuthUser | Any,
         local: bool = False,
-    ) -> PackageDetail:
+    ) -> Response[PackageDetail]:
         """Retrieves a list of files associated with the given project (across all versions)
 
+        Local projects listed in `features.merge_upstream` also include the files of their upstream
+        counterpart (see `merged_file_info()`).
+
         Args:
             context (Context): Application context
             project_name (str): Project name
@@ -100,52 +199,102 @@ class PackageController(Controller):
 
         Raises:
             NotFoundException: Raised if the package couldn't be found
+            ServiceUnavailableException: Raised if the package isn't local or cached while in offline mode
 
         Returns:
-            PackageDetail: Details about the package. Format based on `https://packaging.python.org/en/latest/specifications/simple-repository-api/#project-detail`
+            Response[PackageDetail]: Details about the package, or 304 if the client's copy is current. Format based on `https://packaging.python.org/en/latest/specifications/simple-repository-api/#project-detail`
         """
         if not auth.has_permission(PackagePermission.VIEW, project=project_name):
             raise NotFoundException("Unknown or inaccessible project.")
 
-        if not os.path.exists(context.root.joinpath("index", project_name)):
+        base_url = str(request.base_url).rstrip("/")
+        validators = project_validators(context, project_name, auth, "simple", base_url)
+        if validators == None:
             if len(context.config.proxies) > 0 and not local:
-                for proxy in context.config.proxies:
-                    async with AsyncClient(follow_redirects=True) as client:
-                        result = await client.get(
-                            proxy.urls.index.format(project_name=project_name),
-                            headers={"Accept": "application/vnd.pypi.simple.v1+json"},
-                        )
-                        if result.is_success:
-                            return PackageDetail(**result.json())
+                offline = context.upstream.offline
+                found = await context.upstream.lookup(
+                    "simple", project_name, offline=offline
+                )
+                if found:
+                    proxy, data = found
+                    if context.prefetcher and not offline:
+                        context.prefetcher.schedule(project_name)
+                    detail = PackageDetail(**data)
+                    if context.artifacts:
+                        context.artifacts.rewrite_detail(detail, proxy.name, base_url)
+                    return Response(
+                        detail, headers=STALE_HEADERS if offline else None
+                    )
+                if offline:
+                    raise ServiceUnavailableException(
+                        "Project is not cached & upstreams are unavailable."
+                    )
 
             raise NotFoundException(f"Unknown project {project_name}.")
 
-        base_url = str(request.base_url).rstrip("/")
-        package = Package.assemble_package(
-            context.root.joinpath("index", project_name), url_base=base_url
+        revision, etag, modified = validators
+        if (
+            len(context.config.proxies) > 0
+            and not local
+            and context.config.features.merges_upstream(project_name)
+        ):
+            return await merged_file_info(
+                context, request, project_name, base_url, etag
+            )
+        if is_not_modified(request, etag, modified):
+            return not_modified(etag, modified)
+
+        project_path = str(context.root.joinpath("index", project_name))
+        return await serve_document(
+            request,
+            project_path,
+            "simple",
+            document_key(base_url),
+            revision,
+            lambda: PackageDetail.from_manifest(
+                ProjectManifest.open(project_path), url_base=base_url
+            ),
+            headers=validator_headers(etag, modified),
+            media_type="application/vnd.pypi.simple.v1+json",
         )
-        return package.detail(url_base=base_url)
 
     @get("/", response_headers={"Content-Type": "application/vnd.pypi.simple.v1+json"})
     async def get_file_list(
-        self, context: Context, auth: AuthUser | Any
-    ) -> PackageList:
+        self, context: Context, request: Request, auth: AuthUser | Any
+    ) -> Response[PackageList]:
         """Returns a list of all packages on the local index. Does not include proxied packages to avoid duplication & confusion
 
         Args:
             context (Context): Application context
+            request (Request): Litestar Request object
 
         Returns:
-            PackageList: PackageList object. Based on `https://packaging.python.org/en/latest/specifications/simple-repository-api/#project-list`
+            Response[PackageList]: PackageList object, or 304 if the client's copy is current. Based on `https://packaging.python.org/en/latest/specifications/simple-repository-api/#project-list`
         """
-        names = os.listdir(context.root.joinpath("index"))
-        return PackageList(
-            meta=APIMeta(),
-            projects=[
-                PackageListItem(name=name)
-                for name in names
-                if auth.has_permission(PackagePermission.VIEW, project=name)
-            ],
+        visible = auth.visible_projects()
+        etag = make_etag(
+            os.stat(context.root.joinpath("index")).st_mtime_ns,
+            principal_key(auth),
+            visible if visible == "all" else ",".join(sorted(visible)),
+        )
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        if visible == "all":
+            names = os.listdir(context.root.joinpath("index"))
+        else:
+            names = [
+                name
+                for name in visible
+                if context.root.joinpath("index", name).is_dir()
+            ]
+
+        return Response(
+            PackageList(
+                meta=APIMeta(),
+                projects=[PackageListItem(name=name) for name in sorted(names)],
+            ),
+            headers=validator_headers(etag),
         )
 
     @get("/detail/{project_name:str}")
@@ -156,7 +305,7 @@ class PackageController(Controller):
         request: Request,
         auth: AuthUser | Any,
         local: Optional[bool] = False,
-    ) -> Package:
+    ) -> Response[Package]:
         """Gets in-depth information about a specific package's latest version
 
         Args:
@@ -167,26 +316,57 @@ class PackageController(Controller):
 
         Raises:
             NotFoundException: If package wasn't found
+            ServiceUnavailableException: If the package isn't local or cached while in offline mode
 
         Returns:
-            Package: Package details. Based on `https://warehouse.pypa.io/api-reference/json.html#project`
+            Response[Package]: Package details, or 304 if the client's copy is current. Based on `https://warehouse.pypa.io/api-reference/json.html#project`
         """
         if not auth.has_permission(PackagePermission.VIEW, project=project_name):
             raise NotFoundException("Unknown or inaccessible project.")
+        validators = project_validators(
+            context, project_name, auth, "detail", request.base_url
+        )
+        project_path = str(context.root.joinpath("index", project_name))
         try:
-            return Package.assemble_package(
-                context.root.joinpath("index", project_name), url_base=request.base_url
+            if validators == None:
+                raise FileNotFoundError(f"Package '{project_name}' is not local.")
+            revision, etag, modified = validators
+            if is_not_modified(request, etag, modified):
+                return not_modified(etag, modified)
+
+            return await serve_document(
+                request,
+                project_path,
+                "detail",
+                document_key(request.base_url),
+                revision,
+                lambda: Package.assemble_package(
+                    project_path, url_base=request.base_url
+                ),
+                headers=validator_headers(etag, modified),
             )
         except FileNotFoundError:
             if len(context.config.proxies) > 0 and not local:
-                for proxy in context.config.proxies:
-                    if proxy.urls.package:
-                        async with AsyncClient(follow_redirects=True) as client:
-                            result = await client.get(
-                                proxy.urls.package.format(project_name=project_name)
-                            )
-                            if result.is_success:
-                                return Package(**result.json(), local=False)
+                offline = context.upstream.offline
+                found = await context.upstream.lookup(
+                    "package", project_name, offline=offline
+                )
+                if found:
+                    proxy, data = found
+                    if context.prefetcher and not offline:
+                        context.prefetcher.schedule(project_name)
+                    package = Package(**data, local=False)
+                    if context.artifacts:
+                        context.artifacts.rewrite_package(
+                            package, proxy.name, str(request.base_url)
+                        )
+                    return Response(
+                        package, headers=STALE_HEADERS if offline else None
+                    )
+                if offline:
+                    raise ServiceUnavailableException(
+                        "Project is not cached & upstreams are unavailable."
+                    )
             raise NotFoundException("Unknown package.")
 
     @get("/detail/{project_name:str}/{version:str}")
@@ -198,7 +378,7 @@ class PackageController(Controller):
         request: Request,
         auth: AuthUser | Any,
         local: Optional[bool] = False,
-    ) -> Package:
+    ) -> Response[Package]:
         """Gets in-depth information about a specific package's specified version
 
         Args:
@@ -210,30 +390,58 @@ class PackageController(Controller):
 
         Raises:
             NotFoundException: If package wasn't found
+            ServiceUnavailableException: If the package isn't local or cached while in offline mode
 
         Returns:
-            Package: Package details. Based on `https://warehouse.pypa.io/api-reference/json.html#release`
+            Response[Package]: Package details, or 304 if the client's copy is current. Based on `https://warehouse.pypa.io/api-reference/json.html#release`
         """
         if not auth.has_permission(PackagePermission.VIEW, project=project_name):
             raise NotFoundException("Unknown or inaccessible project.")
+        validators = project_validators(
+            context, project_name, auth, "detail", request.base_url, version
+        )
+        project_path = str(context.root.joinpath("index", project_name))
         try:
-            return Package.assemble_package(
-                context.root.joinpath("index", project_name),
-                version=version,
-                url_base=request.base_url,
+            if validators == None:
+                raise FileNotFoundError(f"Package '{project_name}' is not local.")
+            revision, etag, modified = validators
+            if is_not_modified(request, etag, modified):
+                # The ETag only covers the project, so the version has to exist before confirming it
+                if not version in ProjectManifest.open(project_path).versions.keys():
+                    raise KeyError(f"Unknown version {version}")
+                return not_modified(etag, modified)
+
+            return await serve_document(
+                request,
+                project_path,
+                "version",
+                document_key(request.base_url, version),
+                revision,
+                lambda: Package.assemble_package(
+                    project_path, version=version, url_base=request.base_url
+                ),
+                headers=validator_headers(etag, modified),
             )
         except FileNotFoundError:
             if len(context.config.proxies) > 0 and not local:
-                for proxy in context.config.proxies:
-                    if proxy.urls.package:
-                        async with AsyncClient(follow_redirects=True) as client:
-                            result = await client.get(
-                                proxy.urls.package.format(
-                                    project_name=project_name + "/" + version
-                                )
-                            )
-                            if result.is_success:
-                                return Package(**result.json(), local=False)
+                offline = context.upstream.offline
+                found = await context.upstream.lookup(
+                    "package", project_name, version, offline=offline
+                )
+                if found:
+                    proxy, data = found
+                    package = Package(**data, local=False)
+                    if context.artifacts:
+                        context.artifacts.rewrite_package(
+                            package, proxy.name, str(request.base_url)
+                        )
+                    return Response(
+                        package, headers=STALE_HEADERS if offline else None
+                    )
+                if offline:
+                    raise ServiceUnavailableException(
+                        "Project is not cached & upstreams are unavailable."
+                    )
             raise NotFoundException("Unknown package.")
         except KeyError:
             raise NotFoundException(f"Unknown version {version}")
@@ -0,0 +1,83 @@
+from litestar import Controller, get
+from pydantic import BaseModel
+from ..models import AuthUser, BaseObject, CacheStats, HasherStats, guard_admin
+from ..context import Context
+from ..health import UpstreamHealthStats
+from ..prefetch import PrefetchStats
+from ..singleflight import SingleFlightStats
+from ..timing import COUNTERS, TIMINGS, TimingStats
+
+
+class ServerMetrics(BaseModel):
+    """
+    Runtime metrics of the running server process.
+
+    Attributes:
+        object_cache (CacheStats): Object cache counters for database models
+        credential_cache (CacheStats): Verified-password cache counters
+        hashing (HasherStats): Password hashing pool load
+        proxy_cache (CacheStats | None): Upstream response cache counters (sizes in bytes), if enabled
+        negative_cache (CacheStats | None): Cached upstream misses, if the proxy cache is enabled
+        upstream_lookups (SingleFlightStats): Upstream lookups started vs. coalesced into in-flight ones
+        prefetch (PrefetchStats | None): Dependency prefetcher counters, if enabled
+        timings (dict[str, TimingStats]): Aggregated per-request timings (as reported in `Server-Timing`)
+        counters (dict[str, int]): Aggregated event counters
+    """
+
+    object_cache: CacheStats
+    credential_cache: CacheStats
+    hashing: HasherStats
+    proxy_cache: CacheStats | None = None
+    negative_cache: CacheStats | None = None
+    upstream_lookups: SingleFlightStats
+    prefetch: PrefetchStats | None = None
+    timings: dict[str, TimingStats]
+    counters: dict[str, int]
+
+
+class ServerController(Controller):
+    """Server introspection & administration"""
+
+    path = "/server"
+    guards = [guard_admin]
+
+    @get("/metrics")
+    async def get_metrics(self, context: Context) -> ServerMetrics:
+        """Returns in-process performance counters
+
+        Args:
+            context (Context): Application context
+
+        Returns:
+            ServerMetrics: Current metrics
+        """
+        return ServerMetrics(
+            object_cache=BaseObject._cache.stats(),
+            credential_cache=AuthUser._credentials.stats(),
+            hashing=context.hasher.stats(),
+            proxy_cache=(
+                context.upstream.cache.stats() if context.upstream.cache else None
+            ),
+            negative_cache=(
+                context.upstream.missing.stats() if context.upstream.missing else None
+            ),
+            upstream_lookups=context.upstream.flights.stats(),
+            prefetch=context.prefetcher.stats() if context.prefetcher else None,
+            timings=TIMINGS,
+            counters=COUNTERS,
+        )
+
+    @get("/upstreams")
+    async def get_upstreams(self, context: Context) -> list[UpstreamHealthStats]:
+        """Returns the health & circuit breaker state of each configured upstream proxy
+
+        Args:
+            context (Context): Application context
+
+        Returns:
+            list[UpstreamHealthStats]: Health of each proxy, in priority order
+        """
+        return [
+            context.upstream.health_of(proxy).stats()
+            for proxy in context.upstream.proxies
+        ]
@@ -133,7 +133,9 @@ class UserController(Controller):
                 status_code=HTTP_409_CONFLICT, detail="Conflict with existing username"
             )
 
-        created = AuthUser.create(data.username, password=data.password)
+        created = await AuthUser.create_async(
+            data.username, context.hasher, password=data.password
+        )
         created.save()
         return RedactedAuth.from_auth(created)
 
@@ -208,15 +210,15 @@ class UserSelfController(Controller):
 
     @post("/password")
     async def change_password(
-        self, auth: AuthUser | Any, data: PasswordChangeModel
+        self, context: Context, auth: AuthUser | Any, data: PasswordChangeModel
     ) -> RedactedAuth:
         if isinstance(auth, AuthAdmin):
             raise ClientException("Cannot change admin password from API")
 
-        if not auth.verify(data.current):
+        if not await auth.verify_async(data.current, context.hasher):
             raise NotAuthorizedException("Incorrect current password")
 
-        auth.password_hash, auth.password_salt = auth.make_password(data.new)
+        await auth.set_password_async(data.new, context.hasher)
         auth.save()
         return RedactedAuth.from_auth(auth)
 
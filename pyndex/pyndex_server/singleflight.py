@@ -0,0 +1,58 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+from pydantic import BaseModel
+from .timing import record_event
+
+T = TypeVar("T")
+
+
+class SingleFlightStats(BaseModel):
+    in_flight: int
+    leaders: int
+    coalesced: int
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single execution.
+
+    The first caller for a key starts the call as a task; callers arriving while it runs await the same
+    result (or exception). The task is shielded from cancellation of any individual caller, so a client
+    disconnecting doesn't fail the others.
+    """
+
+    def __init__(self) -> None:
+        self.calls: dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Runs `func`, or waits for the in-flight call with the same key
+
+        Args:
+            key (Hashable): Call identity
+            func (Callable[[], Awaitable[T]]): Call to perform if none is in flight
+
+        Returns:
+            T: Result of the shared call
+        """
+        task = self.calls.get(key)
+        if task:
+            self.coalesced += 1
+            record_event(None, "single-flight-coalesced")
+        else:
+            task = asyncio.ensure_future(func())
+            self.calls[key] = task
+            self.leaders += 1
+
+            def finished(_: Any) -> None:
+                if self.calls.get(key) is task:
+                    del self.calls[key]
+
+            task.add_done_callback(finished)
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(
+            in_flight=len(self.calls), leaders=self.leaders, coalesced=self.coalesced
+        )
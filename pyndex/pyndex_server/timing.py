@@ -0,0 +1,90 @@
+import time
+from typing import Any
+from litestar.connection import ASGIConnection
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import BaseModel, computed_field
+
+
+class TimingStats(BaseModel):
+    count: int = 0
+    total_ms: float = 0.0
+
+    @computed_field
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count > 0 else 0.0
+
+
+# Process-wide aggregates, reported by /server/metrics
+TIMINGS: dict[str, TimingStats] = {}
+COUNTERS: dict[str, int] = {}
+
+
+def _request_state(scope: Scope) -> dict[str, Any]:
+    state = scope.setdefault("state", {})
+    if not "timings" in state:
+        state["timings"] = {}
+        state["counters"] = {}
+    return state
+
+
+def record_timing(connection: ASGIConnection, name: str, seconds: float) -> None:
+    """Adds a duration to the current request's Server-Timing breakdown & the process aggregates.
+
+    Args:
+        connection (ASGIConnection): Current connection
+        name (str): Metric name
+        seconds (float): Duration in seconds
+    """
+    state = _request_state(connection.scope)
+    state["timings"][name] = state["timings"].get(name, 0.0) + seconds * 1000
+    stats = TIMINGS.setdefault(name, TimingStats())
+    stats.count += 1
+    stats.total_ms += seconds * 1000
+
+
+def record_event(connection: ASGIConnection | None, name: str, count: int = 1) -> None:
+    """Increments a counter for the current request (if any) & the process aggregates.
+
+    Args:
+        connection (ASGIConnection | None): Current connection, or None outside of a request
+        name (str): Counter name
+        count (int, optional): Increment. Defaults to 1.
+    """
+    if connection:
+        state = _request_state(connection.scope)
+        state["counters"][name] = state["counters"].get(name, 0) + count
+    COUNTERS[name] = COUNTERS.get(name, 0) + count
+
+
+def timing_middleware(app: ASGIApp) -> ASGIApp:
+    """Emits a `Server-Timing` header with the durations & counters recorded during each HTTP request."""
+
+    async def middleware(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = _request_state(scope)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                entries = [
+                    f"{name};dur={duration:.3f}"
+                    for name, duration in state["timings"].items()
+                ]
+                entries.extend(
+                    f'{name};desc="{count}"'
+                    for name, count in state["counters"].items()
+                )
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.3f}")
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", ", ".join(entries).encode()),
+                ]
+            await send(message)
+
+        await app(scope, receive, send_wrapper)
+
+    return middleware
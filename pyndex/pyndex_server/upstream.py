@@ -0,0 +1,331 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Literal
+from httpx import AsyncClient, BasicAuth, HTTPError, Limits, Response, Timeout
+from packaging.utils import canonicalize_name
+from .config import ProxyHealthConfig, ProxyItemConfig, ProxyResolutionConfig
+from .health import CircuitOpenError, UpstreamHealth
+from .proxy_cache import NegativeCache, ProxyCache
+from .singleflight import SingleFlight
+from .timing import record_event
+
+# Marks responses served from the proxy cache without consulting the upstream
+STALE_HEADERS = {"warning": '110 - "Response is Stale"'}
+
+
+def make_client(proxy: ProxyItemConfig) -> AsyncClient:
+    """Creates a pooled HTTP client for an upstream proxy, as configured in its `client` section."""
+    return AsyncClient(
+        auth=(
+            BasicAuth(proxy.username, proxy.password or "")
+            if proxy.username
+            else None
+        ),
+        follow_redirects=True,
+        http2=proxy.client.http2,
+        limits=Limits(
+            max_connections=proxy.client.max_connections,
+            max_keepalive_connections=proxy.client.max_keepalive_connections,
+            keepalive_expiry=proxy.client.keepalive_expiry,
+        ),
+        timeout=Timeout(
+            connect=proxy.client.connect_timeout,
+            read=proxy.client.read_timeout,
+            write=proxy.client.write_timeout,
+            pool=proxy.client.pool_timeout,
+        ),
+    )
+
+
+class UpstreamClients:
+    """Long-lived HTTP clients for the configured proxies, one connection pool per proxy.
+
+    Clients are opened when the application starts & closed on shutdown, so connections (and TLS sessions)
+    to each upstream are reused across requests. Successful responses are stored in the proxy cache, if
+    one is given, and projects a proxy reports as missing are skipped for a while if a negative cache is.
+    Each proxy's health is tracked from its requests, and proxies whose circuit breaker is open are skipped.
+
+    In offline mode, which is either configured or entered automatically while every proxy's breaker is
+    open, lookups are answered from the proxy cache only.
+    """
+
+    def __init__(
+        self,
+        proxies: list[ProxyItemConfig],
+        cache: ProxyCache | None = None,
+        missing: NegativeCache | None = None,
+        resolution: ProxyResolutionConfig | None = None,
+        health: ProxyHealthConfig | None = None,
+        offline: bool = False,
+    ) -> None:
+        self.proxies = proxies
+        self.cache = cache
+        self.missing = missing
+        self.resolution = resolution or ProxyResolutionConfig()
+        self.clients: dict[str, AsyncClient] = {}
+        self.flights = SingleFlight()
+        self.health_config = health or ProxyHealthConfig()
+        self.health: dict[str, UpstreamHealth] = {}
+        self.force_offline = offline
+
+    def open(self) -> None:
+        for proxy in self.proxies:
+            if not proxy.name in self.clients:
+                self.clients[proxy.name] = make_client(proxy)
+
+    def client(self, proxy: ProxyItemConfig) -> AsyncClient:
+        """Returns the pooled client of a proxy, opening it if necessary"""
+        if not proxy.name in self.clients:
+            self.clients[proxy.name] = make_client(proxy)
+        return self.clients[proxy.name]
+
+    @property
+    def offline(self) -> bool:
+        """Whether upstream lookups are currently answered from the cache only"""
+        if self.force_offline:
+            return True
+        return len(self.proxies) > 0 and not any(
+            [self.health_of(proxy).available for proxy in self.proxies]
+        )
+
+    def health_of(self, proxy: ProxyItemConfig) -> UpstreamHealth:
+        """Returns the health state of a proxy"""
+        if not proxy.name in self.health:
+            self.health[proxy.name] = UpstreamHealth(proxy.name, self.health_config)
+        return self.health[proxy.name]
+
+    async def get(
+        self,
+        proxy: ProxyItemConfig,
+        url: str,
+        headers: dict[str, str] | None = None,
+        background: bool = False,
+    ) -> Response:
+        """Performs a GET request against a proxy, through the proxy cache
+
+        Requests that reach the upstream are recorded in its health state. Transport errors, 5xx & 429
+        responses count as failures. Background requests are only sent while the breaker is closed (or
+        half-open without a probe in flight) & are never recorded.
+
+        Args:
+            proxy (ProxyItemConfig): Proxy to query
+            url (str): URL to request
+            headers (dict[str, str] | None, optional): Request headers. Defaults to None.
+            background (bool, optional): Whether this is background traffic (e.g. prefetching). Defaults to False.
+
+        Raises:
+            CircuitOpenError: If the request must go upstream but the proxy's circuit breaker is open
+
+        Returns:
+            Response: Upstream (or cached) response
+        """
+        headers = headers or {}
+        client = self.client(proxy)
+        health = self.health_of(proxy)
+
+        async def fetch(conditions: dict[str, str]) -> Response:
+            if background:
+                if not health.available:
+                    raise CircuitOpenError(f"Circuit breaker of upstream {proxy.name} is open.")
+                return await client.get(url, headers={**headers, **conditions})
+
+            allowed, probe = health.allow()
+            if not allowed:
+                record_event(None, "upstream-circuit-open")
+                raise CircuitOpenError(f"Circuit breaker of upstream {proxy.name} is open.")
+
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers={**headers, **conditions})
+            except HTTPError as e:
+                health.record(False, time.perf_counter() - start, type(e).__name__)
+                raise
+            except BaseException:
+                if probe:
+                    health.release()
+                raise
+
+            failed = response.status_code >= 500 or response.status_code == 429
+            health.record(
+                not failed,
+                time.perf_counter() - start,
+                f"HTTP {response.status_code}" if failed else None,
+            )
+            return response
+
+        if self.cache == None:
+            return await fetch({})
+        return await self.cache.get(proxy.name, url, headers.get("Accept"), fetch)
+
+    async def resolve(
+        self,
+        candidates: list[ProxyItemConfig],
+        fetch: Callable[[ProxyItemConfig], Awaitable[Any | None]],
+    ) -> tuple[ProxyItemConfig, Any] | None:
+        """Queries candidate proxies (in priority order) according to the configured resolution mode
+
+        - `sequential`: each proxy is only queried after the previous one failed.
+        - `hedged`: the next proxy is also queried if no answer arrived within `hedge_delay` seconds.
+        - `concurrent`: every proxy is queried at once.
+
+        A proxy that fails causes the next one to be queried immediately. Once an answer arrives, proxies of
+        higher priority that are still in flight get up to `priority_wait` more seconds to answer, and the
+        highest-priority answer wins. Requests still in flight are then cancelled.
+
+        Args:
+            candidates (list[ProxyItemConfig]): Proxies to query, highest priority first
+            fetch (Callable[[ProxyItemConfig], Awaitable[Any | None]]): Queries a proxy, returning None on failure
+
+        Returns:
+            tuple[ProxyItemConfig, Any] | None: The chosen proxy & its answer, or None if all failed
+        """
+        match self.resolution.mode:
+            case "sequential":
+                delay = None
+            case "hedged":
+                delay = self.resolution.hedge_delay
+            case "concurrent":
+                delay = 0.0
+
+        loop = asyncio.get_running_loop()
+        pending: dict[asyncio.Task, int] = {}
+        results: dict[int, Any | None] = {}
+        started = 0
+        deadline: float | None = None
+
+        def start_next() -> None:
+            nonlocal started
+            pending[asyncio.ensure_future(fetch(candidates[started]))] = started
+            started += 1
+
+        try:
+            while started < len(candidates) or pending:
+                answered = [i for i in sorted(results.keys()) if results[i] != None]
+                best = answered[0] if len(answered) > 0 else None
+
+                if best != None:
+                    if all([i in results for i in range(best)]):
+                        break
+                    if deadline == None:
+                        deadline = loop.time() + self.resolution.priority_wait
+                    timeout = max(0.0, deadline - loop.time())
+                    if timeout == 0:
+                        break
+                elif started < len(candidates) and (not pending or delay == 0):
+                    start_next()
+                    continue
+                else:
+                    timeout = delay if started < len(candidates) else None
+
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if len(done) == 0:
+                    if best == None and started < len(candidates):
+                        record_event(None, "upstream-hedged")
+                        start_next()
+                    continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    results[index] = task.result() if not task.exception() else None
+                    if results[index] == None and best == None and started < len(candidates):
+                        start_next()
+        finally:
+            for task in pending.keys():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.keys(), return_exceptions=True)
+
+        for index in sorted(results.keys()):
+            if results[index] != None:
+                return candidates[index], results[index]
+        return None
+
+    async def lookup(
+        self,
+        endpoint: Literal["simple", "package"],
+        project_name: str,
+        version: str | None = None,
+        offline: bool = False,
+        background: bool = False,
+    ) -> tuple[ProxyItemConfig, Any] | None:
+        """Queries the proxies for a project, returning the highest-priority successful JSON response
+
+        Concurrent lookups of the same (endpoint, normalized project, version) share a single upstream query,
+        as long as they are all foreground or all background traffic (which is never recorded in upstream
+        health & mustn't answer for client requests). A 404 for a project (but not for a specific version) is remembered in the negative cache. Offline lookups
+        return the highest-priority cached response, however old, without contacting any upstream.
+
+        Args:
+            endpoint (Literal["simple", "package"]): Simple-API project page, or JSON-API project/release
+            project_name (str): Project name
+            version (str | None, optional): Release version (JSON API only). Defaults to None.
+            offline (bool, optional): Only answer from the proxy cache (see `offline`). Defaults to False.
+            background (bool, optional): Whether this is background traffic (see `get()`). Defaults to False.
+
+        Returns:
+            tuple[ProxyItemConfig, Any] | None: The proxy that answered & its decoded response, or None if none did
+        """
+
+        candidates = [
+            proxy
+            for proxy in self.proxies
+            if (endpoint == "simple" or proxy.urls.package)
+            and not (self.missing and self.missing.contains(proxy.name, endpoint, project_name))
+        ]
+
+        def request(proxy: ProxyItemConfig) -> tuple[str, dict[str, str]]:
+            if endpoint == "simple":
+                url = proxy.urls.index.format(project_name=project_name)
+                return url, {"Accept": "application/vnd.pypi.simple.v1+json"}
+            url = proxy.urls.package.format(
+                project_name=(project_name + "/" + version if version else project_name)
+            )
+            return url, {}
+
+        async def fetch(proxy: ProxyItemConfig) -> Any | None:
+            url, headers = request(proxy)
+            try:
+                result = await self.get(
+                    proxy, url, headers=headers, background=background
+                )
+            except HTTPError:
+                record_event(None, "upstream-error")
+                return None
+            except CircuitOpenError:
+                return None
+
+            if result.is_success:
+                return result.json()
+            if self.missing and result.status_code in (404, 410) and not version:
+                self.missing.add(proxy.name, endpoint, project_name)
+            return None
+
+        async def query() -> tuple[ProxyItemConfig, Any] | None:
+            return await self.resolve(candidates, fetch)
+
+        async def query_cache() -> tuple[ProxyItemConfig, Any] | None:
+            if self.cache == None:
+                return None
+            for proxy in candidates:
+                url, headers = request(proxy)
+                result = await self.cache.peek(proxy.name, url, headers.get("Accept"))
+                if result and result.is_success:
+                    record_event(None, "upstream-offline-hit")
+                    return proxy, result.json()
+            record_event(None, "upstream-offline-miss")
+            return None
+
+        if offline:
+            return await query_cache()
+        return await self.flights.run(
+            (endpoint, canonicalize_name(project_name), version, background), query
+        )
+
+    async def close(self) -> None:
+        if self.cache:
+            await self.cache.close()
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.aclose()
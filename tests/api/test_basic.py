@@ -66,3 +66,49 @@ class TestBasic:
             perms = active.get_permissions()
             assert len(perms) == len(permissions)
             assert all([i.permission in permissions for i in perms])
+
+    def test_metrics(self, admin_client, user_client):
+        response = admin_client.get("/server/metrics")
+        assert response.status_code == 200
+        assert "object_cache" in response.json()
+        assert "auth;dur=" in response.headers["server-timing"]
+        assert 'auth-reused;desc="1"' in response.headers["server-timing"]
+        assert response.json()["counters"]["auth-reused"] >= 1
+
+        with user_client("alice", "alice") as client:
+            assert client.get("/server/metrics").status_code == 401
+
+    def test_upstreams(self, admin_client, user_client):
+        response = admin_client.get("/server/upstreams")
+        assert response.status_code == 200
+        assert [i["name"] for i in response.json()] == ["PyPi"]
+        assert response.json()[0]["state"] == "closed"
+
+        with user_client("alice", "alice") as client:
+            assert client.get("/server/upstreams").status_code == 401
+
+    @pytest.mark.parametrize(
+        ["username", "password", "status"],
+        [("alice", "alice", 401), ("bob", "bob", 201)],
+    )
+    def test_create_permission(
+        self, username: str, password: str, status: int, admin_client, user_client
+    ):
+        with user_client(username, password) as client:
+            response = client.post(
+                "/packages/upload",
+                data={
+                    "metadata_version": "2.1",
+                    "name": f"created-by-{username}",
+                    "version": "1.0",
+                    "protocol_version": "1",
+                    "filetype": "sdist",
+                },
+                files={
+                    "content": (f"created_by_{username}-1.0.tar.gz", b"content")
+                },
+            )
+            assert response.status_code == status
+
+        listed = admin_client.get(f"/packages/detail/created-by-{username}")
+        assert (listed.status_code == 200) == (status == 201)
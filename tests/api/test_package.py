@@ -1,6 +1,9 @@
+import hashlib
+import json
 from typing import Callable, Iterator
 import pytest
 from pyndex.pyndex_api import Pyndex, UserItem
+from pyndex.common import ProjectManifest
 
 AS_USER = Callable[[str, str | None], Iterator[Pyndex]]
 
@@ -41,3 +44,155 @@ class TestPackageFormat:
         assert result != None
         assert result.info.name == package
         assert result.local == local
+
+    def test_list_visibility(self, admin_client, user_client):
+        listed = admin_client.get("/packages/").json()["projects"]
+        assert "pyndex" in [i["name"] for i in listed]
+
+        with user_client("bob", "bob") as client:
+            assert client.get("/packages/").json()["projects"] == []
+
+    def test_manifest(self, env, admin_client):
+        project = env / "storage" / "index" / "pyndex"
+        manifest = ProjectManifest.load(str(project))
+        assert manifest != None
+        sidecars = [i for i in project.glob("[!.]*/*.json")]
+        assert len(manifest.files()) == len(sidecars)
+
+        files = admin_client.get("/packages/pyndex").json()["files"]
+        assert [i["filename"] for i in files] == [i.filename for i in manifest.files()]
+        assert all([i["size"] > 0 for i in files])
+
+        project.joinpath(ProjectManifest.FILENAME).unlink()
+        assert ProjectManifest.open(str(project)) == manifest
+        assert all([i["hashes"]["sha256"] and i["size"] for i in files])
+
+    def test_download(self, admin_client):
+        entry = admin_client.get("/packages/pyndex").json()["files"][0]
+        url = entry["url"].split("/files/", maxsplit=1)[1]
+
+        full = admin_client.get(f"/files/{url}")
+        assert full.status_code == 200
+        assert full.headers["etag"] == f'"{entry["hashes"]["sha256"]}"'
+        assert "immutable" in full.headers["cache-control"]
+        assert full.headers["accept-ranges"] == "bytes"
+        assert len(full.content) == entry["size"]
+
+        partial = admin_client.get(f"/files/{url}", headers={"Range": "bytes=10-"})
+        assert partial.status_code == 206
+        assert partial.content == full.content[10:]
+        assert partial.headers["content-range"] == f"bytes 10-{entry['size'] - 1}/{entry['size']}"
+
+        suffix = admin_client.get(f"/files/{url}", headers={"Range": "bytes=-5"})
+        assert suffix.content == full.content[-5:]
+
+        stale = admin_client.get(
+            f"/files/{url}", headers={"Range": "bytes=0-9", "If-Range": '"other"'}
+        )
+        assert stale.status_code == 200 and stale.content == full.content
+
+        unsatisfiable = admin_client.get(
+            f"/files/{url}", headers={"Range": f"bytes={entry['size']}-"}
+        )
+        assert unsatisfiable.status_code == 416
+
+        invalid = admin_client.get(f"/files/{url}", headers={"Range": "bytes=5-3"})
+        assert invalid.status_code == 200 and invalid.content == full.content
+
+    def test_conditional_get(self, admin_client, user_client):
+        etags = {}
+        for path in ["/packages/", "/packages/pyndex", "/packages/detail/pyndex"]:
+            first = admin_client.get(path)
+            assert first.status_code == 200
+            etag = etags[path] = first.headers["etag"]
+
+            cached = admin_client.get(path, headers={"If-None-Match": etag})
+            assert cached.status_code == 304
+            assert cached.headers["etag"] == etag and cached.content == b""
+
+        simple = admin_client.get("/packages/pyndex")
+        assert simple.headers["content-type"].startswith("application/vnd.pypi.simple.v1+json")
+        since = admin_client.get(
+            "/packages/pyndex",
+            headers={"If-Modified-Since": simple.headers["last-modified"]},
+        )
+        assert since.status_code == 304
+
+        with user_client("bob", "bob") as client:
+            listed = client.get(
+                "/packages/", headers={"If-None-Match": etags["/packages/"]}
+            )
+            assert listed.status_code == 200
+
+        version = admin_client.get("/packages/detail/pyndex").json()["info"]["version"]
+        for name, status in [(version, 304), ("0.0.0.dev404", 404)]:
+            response = admin_client.get(
+                f"/packages/detail/pyndex/{name}", headers={"If-None-Match": "*"}
+            )
+            assert response.status_code == status
+
+    def test_precompressed(self, env, admin_client):
+        plain = admin_client.get("/packages/pyndex", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        for encoding in ["gzip", "br"]:
+            encoded = admin_client.get(
+                "/packages/pyndex", headers={"Accept-Encoding": encoding}
+            )
+            assert encoded.headers["content-encoding"] == encoding
+            assert "Accept-Encoding" in encoded.headers["vary"]
+            assert encoded.json() == plain.json()
+
+        stored = list((env / "storage" / "index" / "pyndex" / ".documents").iterdir())
+        assert {i.suffix for i in stored} == {".json", ".gz", ".br"}
+
+    def test_core_metadata(self, admin_client):
+        files = admin_client.get("/packages/pyndex").json()["files"]
+        wheel = [i for i in files if i["filename"].endswith(".whl")][0]
+        url = wheel["url"].split("/files/", maxsplit=1)[1]
+
+        result = admin_client.get(f"/files/{url}.metadata")
+        assert result.status_code == 200
+        assert result.content.startswith(b"Metadata-Version: ")
+        assert hashlib.sha256(result.content).hexdigest() == wheel["dist_info_meta"]["sha256"]
+        assert result.headers["etag"] == f'"{wheel["dist_info_meta"]["sha256"]}"'
+
+    def test_core_metadata_backfill(self, env, admin_client):
+        project = env / "storage" / "index" / "pyndex"
+        wheel = [
+            i
+            for i in ProjectManifest.open(str(project)).files()
+            if i.filename.endswith(".whl")
+        ][0]
+        sidecar = project / wheel.version / (wheel.filename + ".json")
+        data = json.loads(sidecar.read_text())
+        data["core_metadata_sha256"] = None
+        sidecar.write_text(json.dumps(data))
+        (project / wheel.version / (wheel.filename + ".metadata")).unlink()
+        ProjectManifest.rebuild(str(project))
+
+        def listed() -> dict:
+            files = admin_client.get("/packages/pyndex").json()["files"]
+            return [i for i in files if i["filename"] == wheel.filename][0]
+
+        assert listed()["dist_info_meta"] == True
+        url = f"/files/pyndex/{wheel.version}/{wheel.filename}.metadata"
+        first, second = admin_client.get(url), admin_client.get(url)
+        assert first.headers["etag"] == f'"{wheel.core_metadata_sha256}"'
+        assert second.headers["etag"] == first.headers["etag"]
+        assert first.headers["accept-ranges"] == "bytes"
+        partial = admin_client.get(url, headers={"Range": "bytes=0-9"})
+        assert partial.status_code == 206 and partial.content == first.content[:10]
+        assert listed()["dist_info_meta"] == {"sha256": wheel.core_metadata_sha256}
+
+
+class TestOffline:
+    def test_uncached_project(self, admin_client):
+        admin_client.app.state.context.upstream.force_offline = True
+        for url in [
+            "/packages/not-cached-anywhere",
+            "/packages/detail/not-cached-anywhere",
+            "/packages/detail/not-cached-anywhere/1.0",
+        ]:
+            assert admin_client.get(url).status_code == 503
+        assert admin_client.get("/packages/not-cached-anywhere?local=true").status_code == 404
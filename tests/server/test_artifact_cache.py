@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import pathlib
+import pytest
+from httpx import AsyncClient, MockTransport, Response
+from pyndex.pyndex_server.artifact_cache import ArtifactCache
+from pyndex.pyndex_server.models import PackageDetail
+
+CONTENT = b"wheel contents" * 10000
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def make_client() -> AsyncClient:
+    return AsyncClient(
+        transport=MockTransport(lambda request: Response(200, content=CONTENT))
+    )
+
+
+async def download(cache: ArtifactCache, sha256: str) -> bytes:
+    async with make_client() as client:
+        upstream = await cache.open_upstream(client, "https://files.invalid/demo.whl")
+        return b"".join([chunk async for chunk in cache.tee(sha256, upstream)])
+
+
+def test_rewrite(tmp_path: pathlib.Path):
+    cache = ArtifactCache(str(tmp_path))
+    detail = PackageDetail(
+        meta={},
+        name="demo",
+        files=[
+            {
+                "filename": "demo-1.0-py3-none-any.whl",
+                "url": "https://files.invalid/demo.whl",
+                "hashes": {"sha256": SHA256.upper()},
+            },
+            {"filename": "demo-1.0.tar.gz", "url": "https://files.invalid/demo.tar.gz", "hashes": {}},
+        ],
+    )
+    cache.rewrite_detail(detail, "pypi", "http://pyndex/")
+
+    assert detail.files[0].url == f"http://pyndex/mirror/{SHA256}/demo-1.0-py3-none-any.whl"
+    assert detail.files[1].url == "https://files.invalid/demo.tar.gz"
+    assert cache.source(SHA256) == ("pypi", "https://files.invalid/demo.whl")
+
+
+def test_tee(tmp_path: pathlib.Path):
+    cache = ArtifactCache(str(tmp_path))
+    assert asyncio.run(download(cache, SHA256)) == CONTENT
+    assert pathlib.Path(cache.path(SHA256)).read_bytes() == CONTENT
+
+    with pytest.raises(ValueError):
+        asyncio.run(download(cache, "0" * 64))
+    assert not pathlib.Path(cache.path("0" * 64)).exists()
+    assert not list(tmp_path.glob("*/.*.part"))
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import pathlib
+import httpx
+import pytest
+from litestar import Request
+from litestar.exceptions import HTTPException
+from pyndex.pyndex_server.artifact_cache import ArtifactCache
+from pyndex.pyndex_server.artifacts import requested_range
+
+
+def make_request(**headers: str) -> Request:
+    return Request(
+        scope={
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def test_requested_range():
+    strong, weak = '"abc"', 'W/"100-10"'
+    assert requested_range(make_request(range="bytes=2-5"), 10, weak) == (2, 5)
+    assert requested_range(make_request(range="bytes=2-5", if_range=strong), 10, strong) == (2, 5)
+    assert requested_range(make_request(range="bytes=2-5", if_range='"other"'), 10, strong) == None
+    assert requested_range(make_request(range="bytes=2-5", if_range=weak), 10, weak) == None
+    assert requested_range(make_request(), 10, strong) == None
+
+
+def test_invalid_range():
+    strong = '"abc"'
+    assert requested_range(make_request(range="bytes=5-3"), 10, strong) == None
+    assert requested_range(make_request(range="bytes=a-3"), 10, strong) == None
+    assert requested_range(make_request(range="bytes=-3"), 10, strong) == (7, 9)
+    with pytest.raises(HTTPException) as error:
+        requested_range(make_request(range="bytes=-0"), 10, strong)
+    assert error.value.status_code == 416
+
+
+class ChunkedBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        for _ in range(4):
+            yield b"x" * 250
+
+
+@pytest.mark.parametrize("matches", [True, False])
+def test_tee(tmp_path: pathlib.Path, matches: bool):
+    cache = ArtifactCache(str(tmp_path))
+    sha256 = hashlib.sha256(b"x" * 1000).hexdigest() if matches else "0" * 64
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda _: httpx.Response(200, stream=ChunkedBody()))
+    )
+
+    async def receive() -> tuple[bytes, Exception | None]:
+        received = b""
+        try:
+            upstream = await cache.open_upstream(client, "https://mirror.invalid/f")
+            async for chunk in cache.tee(sha256, upstream):
+                received += chunk
+        except ValueError as error:
+            return received, error
+        return received, None
+
+    received, error = asyncio.run(receive())
+    if matches:
+        assert received == b"x" * 1000 and error == None
+        assert pathlib.Path(cache.path(sha256)).read_bytes() == received
+    else:
+        # The client is cut off before the final chunk & nothing is cached
+        assert isinstance(error, ValueError) and len(received) == 750
+        assert not pathlib.Path(cache.path(sha256)).exists()
+        assert list(pathlib.Path(cache.path(sha256)).parent.iterdir()) == []
@@ -0,0 +1,105 @@
+import asyncio
+import pathlib
+from pyndex.pyndex_server.models import (
+    AuthGroup,
+    AuthPermission,
+    AuthToken,
+    AuthUser,
+    CredentialCache,
+    MetaPermission,
+    PackagePermission,
+    PasswordHasher,
+    SQLiteEngine,
+    initialize,
+)
+from pyndex.pyndex_server.models.permissions import PermissionTable
+
+
+def test_credential_cache():
+    cache = CredentialCache(ttl=60)
+    AuthUser.set_credential_cache(cache)
+
+    user = AuthUser.create("alice", password="alice")
+    assert user.verify("alice")
+    assert user.verify("alice")
+    assert not user.verify("wrong")
+    assert cache.stats().hits == 1
+
+    user.set_password("changed")
+    assert len(cache.entries) == 0
+    assert not user.verify("alice")
+    assert user.verify("changed")
+
+    AuthUser.set_credential_cache(CredentialCache(ttl=0))
+
+
+def test_password_hasher():
+    hasher = PasswordHasher(workers=2)
+    user = AuthUser.create("bob", password="bob")
+
+    async def verify_all() -> list[bool]:
+        return await asyncio.gather(
+            *[user.verify_async(i, hasher) for i in ["bob", "wrong", "bob"]]
+        )
+
+    assert asyncio.run(verify_all()) == [True, False, True]
+    stats = hasher.stats()
+    assert stats.completed == 3
+    assert stats.queued == 0 and stats.running == 0
+    hasher.close()
+
+
+def test_effective_permissions(tmp_path: pathlib.Path):
+    initialize(
+        SQLiteEngine(str(tmp_path.joinpath("pyndex.db"))),
+        [AuthGroup, AuthToken, AuthUser, AuthPermission],
+    )
+    group = AuthGroup(name="devs")
+    group.save()
+    user = AuthUser.create("carol")
+    user.save()
+
+    AuthPermission(
+        permission="pkg.view", target_type="auth", target_id=user.id, project="a"
+    ).save()
+    assert user.has_permission(PackagePermission.VIEW, project="a")
+    assert not user.has_permission(PackagePermission.EDIT, project="a")
+    assert not user.has_permission(MetaPermission.CREATE)
+
+    AuthPermission(
+        permission="pkg.manage", target_type="group", target_id=group.id, project="a"
+    ).save()
+    assert not user.has_permission(PackagePermission.EDIT, project="a")
+    user.groups.append(group.id)
+    user.save()
+    assert user.has_permission(PackagePermission.EDIT, project="a")
+    assert user.check_access("a") == PackagePermission.MANAGE
+
+    group.delete()
+    assert user.check_access("a") == PackagePermission.VIEW
+
+    admin = AuthPermission(
+        permission="meta.admin", target_type="auth", target_id=user.id
+    )
+    admin.save()
+    assert user.is_admin and user.has_permission(PackagePermission.MANAGE, "b")
+    admin.delete()
+    assert not user.is_admin
+
+
+def test_permission_table_eviction():
+    loads: list[tuple[str, str]] = []
+
+    def load_grants(target_type: str, target_id: str) -> list[tuple[str, str | None]]:
+        loads.append((target_type, target_id))
+        return [("pkg.view", target_id)]
+
+    table = PermissionTable(None, load_grants, lambda _: True, max_entries=2)
+    for user in ["a", "b", "a", "c"]:
+        table.resolve("auth", user, [])
+    assert list(table.effective.keys()) == [("auth", "a"), ("auth", "c")]
+    assert len(table.grants) == 2
+
+    assert table.resolve("auth", "b", []).projects == {"b": PackagePermission.VIEW}
+    assert list(table.effective.keys()) == [("auth", "c"), ("auth", "b")]
+    assert loads.count(("auth", "a")) == 1
@@ -0,0 +1,21 @@
+import os
+from pyndex.pyndex_server.documents import ProjectDocuments, document_key
+
+
+def test_document_key_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProjectDocuments, "MAX_KEYS", 3)
+    documents = ProjectDocuments(str(tmp_path))
+    keys = [document_key(f"http://host-{i}") for i in range(5)]
+    for index, key in enumerate(keys):
+        documents.write("simple", key, "1.0", b"{}")
+        for name in os.listdir(documents.root):
+            if key in name:
+                os.utime(os.path.join(documents.root, name), (index, index))
+
+    documents.write("simple", keys[-1], "2.0", b"{}")
+    assert documents.read("simple", keys[0], "1.0", None) == None
+    assert documents.read("simple", keys[1], "1.0", None) == None
+    assert documents.read("simple", keys[2], "1.0", None) == b"{}"
+    assert documents.read("simple", keys[-1], "1.0", None) == None
+    assert documents.read("simple", keys[-1], "2.0", "gzip") != None
+    assert len({i.rsplit("-", 1)[0] for i in os.listdir(documents.root)}) == 3
@@ -0,0 +1,56 @@
+import pytest
+from pydantic import ValidationError
+from pyndex.pyndex_server.config import Config, FeatureConfig
+from pyndex.pyndex_server.models import PackageDetail
+
+
+def make_detail(source: str, filenames: list[str]) -> PackageDetail:
+    return PackageDetail(
+        meta={"api-version": "1.0"},
+        name="requests",
+        files=[
+            {"filename": i, "url": f"https://{source}/{i}", "hashes": {}}
+            for i in filenames
+        ],
+    )
+
+
+def test_merge_local_wins():
+    local = make_detail("local", ["requests-2.31.0+internal.1-py3-none-any.whl"])
+    upstream = make_detail(
+        "upstream",
+        [
+            "requests-2.31.0+internal.1-py3-none-any.whl",
+            "requests-2.31.0-py3-none-any.whl",
+            "requests-2.32.0-py3-none-any.whl",
+        ],
+    )
+
+    merged = local.merge(upstream)
+    assert [i.filename for i in merged.files] == [
+        "requests-2.31.0+internal.1-py3-none-any.whl",
+        "requests-2.31.0-py3-none-any.whl",
+        "requests-2.32.0-py3-none-any.whl",
+    ]
+    assert merged.files[0].url.startswith("https://local/")
+    assert len(local.files) == 1
+
+
+def test_merges_upstream():
+    features = FeatureConfig(merge_upstream=["Typing_Extensions"])
+    assert features.merges_upstream("typing-extensions")
+    assert features.merges_upstream("typing.extensions")
+    assert not features.merges_upstream("requests")
+    assert FeatureConfig(merge_upstream=["*"]).merges_upstream("requests")
+    assert not FeatureConfig().merges_upstream("requests")
+
+
+def test_merge_requires_proxy_cache(tmp_path):
+    fields = {
+        "storage": {"root": str(tmp_path), "proxy_cache": {"enabled": False}},
+        "api": {"path_base": "/"},
+        "auth": {},
+    }
+    assert Config(**fields).features.merge_upstream == []
+    with pytest.raises(ValidationError):
+        Config(**fields, features={"merge_upstream": ["requests"]})
@@ -0,0 +1,111 @@
+import asyncio
+from httpx import AsyncClient, MockTransport, Request, Response
+from pyndex.pyndex_server.config import (
+    ProxyHealthConfig,
+    ProxyItemConfig,
+    ProxyPrefetchConfig,
+)
+from pyndex.pyndex_server.prefetch import Prefetcher, required_projects
+from pyndex.pyndex_server.proxy_cache import ProxyCache
+from pyndex.pyndex_server.upstream import UpstreamClients
+
+GRAPH = {
+    "app": ["Lib_B>=1.0", 'optional-c; extra == "speed"'],
+    "lib-b": ["lib-d (<3)", "lib-b"],
+    "lib-d": ["lib-e"],
+    "lib-e": [],
+}
+
+
+def test_required_projects():
+    assert required_projects(
+        [
+            "Requests[socks]>=2.0",
+            "typing_extensions; python_version < '3.11'",
+            'pytest; extra == "test"',
+            "requests",
+        ]
+    ) == ["requests", "typing-extensions"]
+    assert required_projects(None) == []
+
+
+def test_prefetch_closure(tmp_path):
+    proxy = ProxyItemConfig(
+        name="mirror",
+        priority=0,
+        urls={
+            "index": "https://mirror.invalid/simple/{project_name}",
+            "package": "https://mirror.invalid/pypi/{project_name}/json",
+        },
+    )
+    upstream = UpstreamClients(
+        [proxy], cache=ProxyCache(str(tmp_path), ttl=600, stale_ttl=0, max_size=1024**2)
+    )
+    prefetcher = Prefetcher(upstream, ProxyPrefetchConfig(enabled=True, max_depth=2))
+    requests: list[str] = []
+
+    async def handler(request: Request) -> Response:
+        requests.append(request.url.path)
+        name = request.url.path.split("/")[2]
+        if not name in GRAPH:
+            return Response(404)
+        if request.url.path.startswith("/simple"):
+            return Response(200, json={"name": name, "files": []})
+        return Response(200, json={"info": {"name": name, "requires_dist": GRAPH[name]}})
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        prefetcher.schedule("app")
+        prefetcher.schedule("app")
+        while prefetcher.tasks:
+            await asyncio.gather(*prefetcher.tasks)
+
+        before = len(requests)
+        assert (await upstream.lookup("simple", "lib-d"))[1]["name"] == "lib-d"
+        assert len(requests) == before
+        await prefetcher.close()
+        await upstream.close()
+
+    asyncio.run(run())
+    assert sorted(requests) == [
+        "/pypi/app/json",
+        "/pypi/lib-b/json",
+        "/pypi/lib-d/json",
+        "/simple/lib-b",
+        "/simple/lib-d",
+    ]
+    stats = prefetcher.stats()
+    assert stats.scheduled == 3 and stats.completed == 3 and stats.in_flight == 0
+    assert upstream.health["mirror"].stats().successes == 0
+
+
+def test_prefetch_skips_health(tmp_path):
+    proxy = ProxyItemConfig(
+        name="mirror",
+        priority=0,
+        urls={
+            "index": "https://mirror.invalid/simple/{project_name}",
+            "package": "https://mirror.invalid/pypi/{project_name}/json",
+        },
+    )
+    upstream = UpstreamClients(
+        [proxy],
+        cache=ProxyCache(str(tmp_path), ttl=600, stale_ttl=0, max_size=1024**2),
+        health=ProxyHealthConfig(min_requests=1),
+    )
+    prefetcher = Prefetcher(upstream, ProxyPrefetchConfig(enabled=True))
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(
+            transport=MockTransport(lambda request: Response(503))
+        )
+        for name in ["a", "b", "c"]:
+            prefetcher.schedule(name)
+        while prefetcher.tasks:
+            await asyncio.gather(*prefetcher.tasks)
+        await upstream.close()
+
+    asyncio.run(run())
+    health = upstream.health["mirror"].stats()
+    assert health.state == "closed" and health.failures == 0
+    assert not upstream.offline
@@ -0,0 +1,105 @@
+import asyncio
+import pathlib
+import threading
+import time
+from httpx import Response
+from pyndex.pyndex_server import proxy_cache
+from pyndex.pyndex_server.proxy_cache import ProxyCache
+
+
+class Upstream:
+    def __init__(self) -> None:
+        self.requests: list[dict[str, str]] = []
+        self.content = b'{"name": "numpy"}'
+
+    async def fetch(self, conditions: dict[str, str]) -> Response:
+        self.requests.append(conditions)
+        if conditions.get("If-None-Match") == '"v1"':
+            return Response(304)
+        return Response(
+            200,
+            content=self.content,
+            headers={"content-type": "application/json", "etag": '"v1"'},
+        )
+
+
+def test_fresh_and_stale(tmp_path: pathlib.Path):
+    cache = ProxyCache(str(tmp_path), ttl=60, stale_ttl=60, max_size=1024)
+    upstream = Upstream()
+
+    async def run():
+        first = await cache.get("pypi", "https://pypi/numpy", None, upstream.fetch)
+        second = await cache.get("pypi", "https://pypi/numpy", None, upstream.fetch)
+        assert first.json() == second.json() == {"name": "numpy"}
+        assert len(upstream.requests) == 1
+
+        key = cache.make_key("pypi", "https://pypi/numpy", None)
+        cache.entries[key].fetched = time.time() - 90
+        stale = await cache.get("pypi", "https://pypi/numpy", None, upstream.fetch)
+        assert stale.json() == {"name": "numpy"}
+        await asyncio.gather(*cache.refreshing.values())
+        assert upstream.requests[-1] == {"If-None-Match": '"v1"'}
+        assert time.time() - cache.entries[key].fetched < 10
+
+        cache.entries[key].fetched = time.time() - 500
+        await cache.get("pypi", "https://pypi/numpy", None, upstream.fetch)
+        assert len(upstream.requests) == 3 and not cache.refreshing
+
+    asyncio.run(run())
+    assert cache.stats().hits == 2
+
+    reloaded = ProxyCache(str(tmp_path), ttl=60, stale_ttl=60, max_size=1024)
+    assert len(reloaded.entries) == 1
+
+
+def test_eviction(tmp_path: pathlib.Path):
+    cache = ProxyCache(str(tmp_path), ttl=60, stale_ttl=60, max_size=40)
+    upstream = Upstream()
+
+    async def run():
+        for name in ["a", "b", "c"]:
+            await cache.get("pypi", f"https://pypi/{name}", None, upstream.fetch)
+
+    asyncio.run(run())
+    assert cache.stats().evictions == 1
+    assert cache.size <= 40
+    assert len(list(tmp_path.glob("*.body"))) == 2
+
+
+def test_cancelled_store(tmp_path: pathlib.Path, monkeypatch):
+    cache = ProxyCache(str(tmp_path), ttl=60, stale_ttl=60, max_size=1024)
+    upstream = Upstream()
+    write_atomic = proxy_cache.write_atomic
+    started, release = threading.Event(), threading.Event()
+    written: list[str] = []
+
+    def blocked_write(path: str, data: str | bytes) -> None:
+        started.set()
+        release.wait(5)
+        write_atomic(path, data)
+        written.append(path)
+
+    monkeypatch.setattr(proxy_cache, "write_atomic", blocked_write)
+
+    async def run():
+        task = asyncio.create_task(
+            cache.get("pypi", "https://pypi/numpy", None, upstream.fetch)
+        )
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+
+        # The worker thread finishes writing after the cancellation
+        release.set()
+        while len(written) < 2:
+            await asyncio.sleep(0.01)
+        for _ in range(100):
+            if not list(tmp_path.iterdir()):
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert len(cache.entries) == 0 and cache.size == 0
+    assert list(tmp_path.iterdir()) == []
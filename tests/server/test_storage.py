@@ -0,0 +1,147 @@
+import pathlib
+from tinydb import where
+from pyndex.pyndex_server.models import (
+    AuthPermission,
+    AuthToken,
+    AuthUser,
+    BaseObject,
+    SQLiteEngine,
+    TinyDBEngine,
+    initialize,
+    open_engine,
+)
+
+
+def make_documents() -> list[tuple[str, dict]]:
+    return [
+        ("creds", {"id": "u1", "type": "user", "username": "alice", "groups": ["g1"]}),
+        ("creds", {"id": "u2", "type": "user", "username": "bob", "groups": []}),
+        ("creds", {"id": "t1", "type": "token", "token": "abc", "groups": ["g1"]}),
+        (
+            "permissions",
+            {
+                "id": "p1",
+                "permission": "pkg.view",
+                "target_type": "auth",
+                "target_id": "u1",
+                "project": "pyndex",
+            },
+        ),
+        (
+            "permissions",
+            {
+                "id": "p2",
+                "permission": "meta.create",
+                "target_type": "auth",
+                "target_id": "u1",
+                "project": None,
+            },
+        ),
+    ]
+
+
+def test_sqlite_queries(tmp_path: pathlib.Path):
+    engine = SQLiteEngine(str(tmp_path.joinpath("pyndex.db")))
+    for collection, doc in make_documents():
+        engine.upsert(collection, doc)
+
+    assert engine.get("creds", "u1")["username"] == "alice"
+    assert [i["id"] for i in engine.search("creds", where("username") == "bob")] == [
+        "u2"
+    ]
+    members = engine.search(
+        "creds", (where("groups").any(["g1"])) & (where("type") == "user")
+    )
+    assert [i["id"] for i in members] == ["u1"]
+    assert len(
+        engine.search(
+            "permissions",
+            (where("target_id") == "u1") & (where("project") == None),
+        )
+    ) == 1
+    assert engine.contains("creds", where("token") == "abc")
+
+    engine.upsert("creds", {**engine.get("creds", "u1"), "groups": []})
+    assert not engine.contains(
+        "creds", (where("groups").any(["g1"])) & (where("type") == "user")
+    )
+
+    engine.remove("creds", "t1")
+    assert engine.get("creds", "t1") == None
+    assert len(engine.all("creds")) == 2
+
+
+def test_tinydb_migration(tmp_path: pathlib.Path):
+    legacy = TinyDBEngine(str(tmp_path.joinpath("pyndex.json")))
+    for collection, doc in make_documents():
+        legacy.upsert(collection, doc)
+    legacy.close()
+
+    engine = open_engine(str(tmp_path), "sqlite")
+    assert not tmp_path.joinpath("pyndex.json").exists()
+    assert tmp_path.joinpath("pyndex.json.migrated").exists()
+    assert len(engine.all("creds")) == 3
+    assert len(engine.all("permissions")) == 2
+    assert sorted(
+        [i["id"] for i in engine.search("creds", where("groups").any(["g1"]))]
+    ) == ["t1", "u1"]
+
+
+def test_secondary_indexes(tmp_path: pathlib.Path):
+    engine = SQLiteEngine(str(tmp_path.joinpath("pyndex.db")))
+    initialize(engine, [AuthUser, AuthToken, AuthPermission])
+
+    alice = AuthUser(username="alice", groups=["g1"])
+    alice.save()
+    token = AuthToken(groups=["g1"])
+    token.save()
+    AuthPermission(
+        permission="pkg.view", target_type="auth", target_id=alice.id, project="a"
+    ).save()
+
+    index = AuthUser._index()
+    assert index.search(where("username") == "alice")[0]["id"] == alice.id
+    assert index.search(where("type") == "user") == None
+    assert AuthUser.from_username("alice").id == alice.id
+    assert AuthToken.from_token(token.token).id == token.id
+    assert len(AuthPermission.get_permissions(alice, project="a")) == 1
+
+    alice.username = "alicia"
+    alice.save()
+    assert AuthUser.from_username("alice") == None
+    assert AuthUser.exists(where("username") == "alicia")
+
+    token.delete()
+    assert (
+        AuthToken.find((where("groups").any(["g1"])) & (where("type") == "token"))
+        == []
+    )
+
+
+def test_identity_map(tmp_path: pathlib.Path):
+    engine = SQLiteEngine(str(tmp_path.joinpath("pyndex.db")))
+    initialize(engine, [AuthUser, AuthToken, AuthPermission], cache_size=2)
+
+    users = [AuthUser(username=name) for name in ["alice", "bob", "carol"]]
+    for user in users:
+        user.save()
+
+    cached = AuthUser.get(users[2].id)
+    assert cached == users[2] and cached is not users[2]
+    assert AuthUser.from_username("carol") is not cached
+
+    cached.username = "caroline"
+    cached.groups.append("editors")
+    assert AuthUser.get(users[2].id).username == "carol"
+    assert AuthUser.get(users[2].id).groups == []
+    cached.save()
+    assert AuthUser.get(users[2].id).username == "caroline"
+    assert AuthUser.get(users[0].id) is not users[0]
+
+    users[2].delete()
+    assert AuthUser.get(users[2].id) == None
+
+    stats = BaseObject._cache.stats()
+    assert stats.capacity == 2
+    assert stats.evictions >= 1
+    assert stats.hits >= 2
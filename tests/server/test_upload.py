@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import io
+import pathlib
+import zipfile
+import pytest
+from litestar.datastructures import UploadFile
+from pyndex.common.models.file_meta import publish_file
+from pyndex.common import (
+    DigestMismatchError,
+    FileMetadata,
+    ProjectManifest,
+    UploadTooLargeError,
+)
+
+
+def make_meta(
+    data: bytes, filename: str = "demo-1.0.tar.gz", **fields
+) -> FileMetadata:
+    content = UploadFile("application/octet-stream", filename, file_data=data)
+    return FileMetadata(
+        metadata_version="2.1",
+        name="demo",
+        version="1.0",
+        protocol_version=1,
+        filetype="sdist",
+        content=content,
+        **fields,
+    )
+
+
+def test_streamed_save(tmp_path: pathlib.Path):
+    data = b"x" * (3 * 1024 * 1024 + 17)
+    asyncio.run(make_meta(data).save(str(tmp_path)))
+
+    version = tmp_path / "demo" / "1.0"
+    assert (version / "demo-1.0.tar.gz").read_bytes() == data
+    assert not list(version.glob(".*.part"))
+    assert ProjectManifest.open(str(tmp_path / "demo")).files()[0].size == len(data)
+    serial, _ = ProjectManifest.validator(str(tmp_path / "demo"))
+
+    asyncio.run(make_meta(b"wheel", filename="demo-1.0-py3-none-any.whl").save(str(tmp_path)))
+    assert ProjectManifest.validator(str(tmp_path / "demo"))[0] == serial + 1
+
+    with pytest.raises(FileExistsError):
+        asyncio.run(make_meta(b"other").save(str(tmp_path)))
+
+
+def test_upload_too_large(tmp_path: pathlib.Path):
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(make_meta(b"x" * 2048).save(str(tmp_path), max_size=1024))
+
+    assert not (tmp_path / "demo").exists()
+
+
+def test_upload_digests(tmp_path: pathlib.Path):
+    data = b"pyndex" * 1000
+    meta = make_meta(data, sha256_digest=hashlib.sha256(data).hexdigest().upper())
+    asyncio.run(meta.save(str(tmp_path)))
+
+    entry = ProjectManifest.open(str(tmp_path / "demo")).files()[0]
+    assert entry.md5_digest == hashlib.md5(data).hexdigest()
+    assert entry.blake2_256_digest == hashlib.blake2b(data, digest_size=32).hexdigest()
+    assert entry.size == len(data)
+
+    saved = FileMetadata.get_files(str(tmp_path / "demo" / "1.0"))[0]
+    assert saved.sha256_digest == hashlib.sha256(data).hexdigest()
+    assert saved.size == len(data)
+
+
+def test_digest_mismatch(tmp_path: pathlib.Path):
+    asyncio.run(make_meta(b"first").save(str(tmp_path)))
+    meta = make_meta(b"pyndex", md5_digest=hashlib.md5(b"other").hexdigest())
+    meta.version = "2.0"
+    with pytest.raises(DigestMismatchError):
+        asyncio.run(meta.save(str(tmp_path)))
+
+    assert not (tmp_path / "demo" / "2.0").exists()
+    assert (tmp_path / "demo" / "1.0" / "demo-1.0.tar.gz").read_bytes() == b"first"
+
+
+def test_core_metadata(tmp_path: pathlib.Path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as wheel:
+        wheel.writestr("demo/__init__.py", "")
+        wheel.writestr("demo-1.0.dist-info/METADATA", "Metadata-Version: 2.1\nName: demo\n")
+    meta = make_meta(buffer.getvalue(), filename="demo-1.0-py3-none-any.whl")
+    asyncio.run(meta.save(str(tmp_path)))
+
+    stored = tmp_path / "demo" / "1.0" / "demo-1.0-py3-none-any.whl.metadata"
+    assert stored.read_bytes() == b"Metadata-Version: 2.1\nName: demo\n"
+    entry = ProjectManifest.open(str(tmp_path / "demo")).files()[0]
+    assert entry.core_metadata_sha256 == hashlib.sha256(stored.read_bytes()).hexdigest()
+
+    sdist = make_meta(b"sdist", summary="Demo")
+    asyncio.run(sdist.save(str(tmp_path)))
+    stored = tmp_path / "demo" / "1.0" / "demo-1.0.tar.gz.metadata"
+    assert stored.read_text() == sdist.as_metadata()
+    assert "Summary: Demo\n" in stored.read_text()
+
+
+def test_publish_without_links(tmp_path: pathlib.Path, monkeypatch):
+    def unsupported(source, target):
+        raise PermissionError("Hard links are not supported.")
+
+    monkeypatch.setattr("os.link", unsupported)
+    asyncio.run(make_meta(b"first").save(str(tmp_path)))
+    target = tmp_path / "demo" / "1.0" / "demo-1.0.tar.gz"
+    assert target.read_bytes() == b"first"
+
+    source = tmp_path / "other"
+    source.write_bytes(b"second")
+    with pytest.raises(FileExistsError):
+        publish_file(str(source), str(target))
+    assert target.read_bytes() == b"first"
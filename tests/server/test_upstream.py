@@ -0,0 +1,305 @@
+import asyncio
+from httpx import AsyncClient, BasicAuth, MockTransport, Request, Response
+import pytest
+from pydantic import ValidationError
+from pyndex.pyndex_server.config import (
+    Config,
+    ProxyHealthConfig,
+    ProxyItemConfig,
+    ProxyResolutionConfig,
+)
+from pyndex.pyndex_server.health import UpstreamHealth
+from pyndex.pyndex_server.proxy_cache import NegativeCache, ProxyCache
+from pyndex.pyndex_server.upstream import UpstreamClients
+
+
+def make_proxy(name: str = "mirror", priority: int = 0, **fields) -> ProxyItemConfig:
+    return ProxyItemConfig(
+        name=name,
+        priority=priority,
+        **{"urls": {"index": f"https://{name}.invalid/simple/{{project_name}}"}, **fields},
+    )
+
+
+def test_pooled_clients():
+    proxy = make_proxy(
+        username="reader",
+        password="secret",
+        client={"read_timeout": 12.0, "max_connections": 4},
+    )
+    upstream = UpstreamClients([proxy])
+    upstream.open()
+
+    client = upstream.client(proxy)
+    assert upstream.client(proxy) is client
+    assert client.timeout.read == 12.0
+    assert isinstance(client.auth, BasicAuth)
+
+    asyncio.run(upstream.close())
+    assert client.is_closed
+    assert upstream.client(proxy) is not client
+
+
+def test_single_flight():
+    proxy = make_proxy()
+    upstream = UpstreamClients([proxy])
+    requests: list[str] = []
+
+    async def handler(request: Request) -> Response:
+        requests.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return Response(200, json={"name": "numpy", "files": []})
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        results = await asyncio.gather(
+            *[upstream.lookup("simple", "numpy") for _ in range(5)]
+        )
+        await upstream.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all([i[1]["name"] == "numpy" for i in results])
+    assert requests == ["https://mirror.invalid/simple/numpy"]
+    stats = upstream.flights.stats()
+    assert stats.leaders == 1 and stats.coalesced == 4 and stats.in_flight == 0
+
+
+def test_negative_cache():
+    proxy = make_proxy(
+        urls={
+            "index": "https://mirror.invalid/simple/{project_name}",
+            "package": "https://mirror.invalid/pypi/{project_name}/json",
+        }
+    )
+    upstream = UpstreamClients([proxy], missing=NegativeCache(ttl=60, capacity=2))
+    requests: list[str] = []
+
+    def handler(request: Request) -> Response:
+        requests.append(str(request.url))
+        return Response(404)
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        assert await upstream.lookup("package", "types-demo") == None
+        for name in ["types-demo", "Types_Demo", "types-demo"]:
+            assert await upstream.lookup("simple", name) == None
+        await upstream.close()
+
+    asyncio.run(run())
+    assert requests == [
+        "https://mirror.invalid/pypi/types-demo/json",
+        "https://mirror.invalid/simple/types-demo",
+    ]
+    assert upstream.missing.stats().hits == 2
+
+    upstream.missing.add("mirror", "simple", "b")
+    assert not upstream.missing.contains("mirror", "package", "types-demo")
+    assert upstream.missing.stats().evictions == 1
+    assert upstream.missing.stats().evictions == 1
+
+
+@pytest.mark.parametrize(
+    ["mode", "expected", "slow_delay", "started"],
+    [
+        ("sequential", "slow", 0.05, ["slow"]),
+        ("hedged", "backup", 30.0, ["slow", "backup"]),
+        ("concurrent", "backup", 30.0, ["slow", "backup", "down"]),
+    ],
+)
+def test_resolution(mode: str, expected: str, slow_delay: float, started: list[str]):
+    proxies = [make_proxy("slow", 0), make_proxy("backup", 1), make_proxy("down", 2)]
+    upstream = UpstreamClients(
+        proxies,
+        resolution=ProxyResolutionConfig(mode=mode, hedge_delay=0.1, priority_wait=0.1),
+    )
+    requested: list[str] = []
+    cancelled: list[str] = []
+
+    def make_handler(name: str, delay: float, status: int):
+        async def handler(request: Request) -> Response:
+            requested.append(name)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return Response(status, json={"name": name})
+
+        return handler
+
+    async def run():
+        for proxy, delay, status in zip(
+            proxies, [slow_delay, 0.0, 0.0], [200, 200, 503]
+        ):
+            upstream.clients[proxy.name] = AsyncClient(
+                transport=MockTransport(make_handler(proxy.name, delay, status))
+            )
+        result = await upstream.lookup("simple", "numpy")
+        await upstream.close()
+        return result
+
+    proxy, data = asyncio.run(run())
+    assert proxy.name == expected and data["name"] == expected
+    if mode == "sequential":
+        assert requested == started and cancelled == []
+    else:
+        assert set(started) <= set(requested)
+        assert cancelled == ["slow"]
+
+
+def test_resolution_priority():
+    proxies = [make_proxy("primary", 0), make_proxy("secondary", 1)]
+    upstream = UpstreamClients(
+        proxies, resolution=ProxyResolutionConfig(mode="concurrent", priority_wait=0.5)
+    )
+
+    async def run():
+        for proxy, delay in zip(proxies, [0.1, 0.0]):
+
+            async def handler(request: Request, delay=delay, name=proxy.name) -> Response:
+                await asyncio.sleep(delay)
+                return Response(200, json={"name": name})
+
+            upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        result = await upstream.lookup("simple", "numpy")
+        await upstream.close()
+        return result
+
+    proxy, _ = asyncio.run(run())
+    assert proxy.name == "primary"
+
+
+def test_circuit_breaker():
+    proxies = [make_proxy("flaky", 0), make_proxy("backup", 1)]
+    upstream = UpstreamClients(
+        proxies,
+        health=ProxyHealthConfig(min_requests=2, error_threshold=0.5, cooldown=0.2),
+    )
+    requests: list[str] = []
+    status = {"flaky": 503, "backup": 200}
+
+    def make_handler(name: str):
+        async def handler(request: Request) -> Response:
+            requests.append(name)
+            return Response(status[name], json={"name": name})
+
+        return handler
+
+    async def run():
+        for proxy in proxies:
+            upstream.clients[proxy.name] = AsyncClient(
+                transport=MockTransport(make_handler(proxy.name))
+            )
+
+        for project in ["numpy", "scipy", "pandas"]:
+            assert (await upstream.lookup("simple", project))[0].name == "backup"
+        assert requests == ["flaky", "backup", "flaky", "backup", "backup"]
+        assert upstream.health["flaky"].stats().state == "open"
+
+        await asyncio.sleep(0.25)
+        status["flaky"] = 200
+        assert (await upstream.lookup("simple", "numpy"))[0].name == "flaky"
+        await upstream.close()
+
+    asyncio.run(run())
+    flaky = upstream.health["flaky"].stats()
+    assert flaky.state == "closed" and flaky.opened == 1 and flaky.rejected == 1
+    assert flaky.failures == 2 and flaky.last_error == "HTTP 503"
+    assert flaky.latency_ewma_ms != None
+    assert upstream.health["backup"].stats().error_rate == 0
+
+
+def test_offline(tmp_path):
+    proxy = make_proxy()
+    upstream = UpstreamClients(
+        [proxy],
+        cache=ProxyCache(str(tmp_path), ttl=0, stale_ttl=0, max_size=1024**2),
+        health=ProxyHealthConfig(min_requests=1, cooldown=60),
+    )
+    requests: list[str] = []
+    status = {"code": 200}
+
+    async def handler(request: Request) -> Response:
+        requests.append(str(request.url))
+        return Response(status["code"], json={"name": "numpy"})
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        assert (await upstream.lookup("simple", "numpy"))[1]["name"] == "numpy"
+        assert not upstream.offline
+
+        status["code"] = 503
+        assert await upstream.lookup("simple", "numpy") == None
+        assert upstream.offline
+
+        found = await upstream.lookup("simple", "numpy", offline=True)
+        missing = await upstream.lookup("simple", "scipy", offline=True)
+        await upstream.close()
+        return found, missing
+
+    found, missing = asyncio.run(run())
+    assert found[1]["name"] == "numpy" and missing == None
+    assert len(requests) == 2
+
+
+def test_half_open_probe():
+    health = UpstreamHealth("mirror", ProxyHealthConfig(min_requests=1, cooldown=0))
+    assert health.allow() == (True, False)
+    health.record(False, 0.01, "HTTP 503")
+    assert health.state == "open"
+
+    assert health.allow() == (True, True)
+    assert health.allow() == (False, False)
+    assert health.stats().state == "half_open"
+
+    health.release()
+    assert health.allow() == (True, True)
+    health.record(True, 0.01)
+    assert health.state == "closed" and health.allow() == (True, False)
+
+
+def test_unique_proxy_names(tmp_path):
+    fields = {
+        "storage": {"root": str(tmp_path)},
+        "api": {"path_base": "/"},
+        "auth": {},
+    }
+    proxy = {"name": "mirror", "urls": {"index": "https://mirror.invalid/{project_name}"}}
+    config = Config(**fields, proxy={"a": {**proxy, "priority": 0}})
+    assert [i.name for i in config.proxies] == ["mirror"]
+    with pytest.raises(ValidationError):
+        Config(
+            **fields,
+            proxy={"a": {**proxy, "priority": 0}, "b": {**proxy, "priority": 1}},
+        )
+
+
+def test_single_flight_background():
+    proxy = make_proxy()
+    upstream = UpstreamClients([proxy], health=ProxyHealthConfig(cooldown=0))
+    requests: list[str] = []
+
+    async def handler(request: Request) -> Response:
+        requests.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return Response(200, json={"name": "types-demo"})
+
+    async def run():
+        upstream.clients[proxy.name] = AsyncClient(transport=MockTransport(handler))
+        health = upstream.health_of(proxy)
+        health._open()
+        results = await asyncio.gather(
+            upstream.lookup("simple", "Types_Demo", background=True),
+            upstream.lookup("simple", "types-demo"),
+            upstream.lookup("simple", "types.demo"),
+        )
+        await upstream.close()
+        return results
+
+    background, *foreground = asyncio.run(run())
+    assert background[1]["name"] == "types-demo"
+    assert all([i[1]["name"] == "types-demo" for i in foreground])
+    assert len(requests) == 2
+    health = upstream.health["mirror"].stats()
+    assert health.state == "closed" and health.successes == 1